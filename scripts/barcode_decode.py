@@ -70,7 +70,9 @@ def ensure_dir(path: str) -> None:
 def exif_fix(img):
     """Normalize orientation metadata so downstream crops match on-disk pixels."""
 
-    return ImageOps.exif_transpose(img).convert("RGB")
+    img = ImageOps.exif_transpose(img)
+    # convert() always copies, even when the mode already matches
+    return img if img.mode == "RGB" else img.convert("RGB")
 
 
 def resize_to_width(img, target_w: int):
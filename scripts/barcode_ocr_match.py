@@ -7,7 +7,7 @@
 # - Debug mode dumps intermediates
 # - JSON sanitizer converts numpy/pandas objects to plain Python (fixes int64 serialization)
 
-import json, re, difflib, sys, csv, os
+import json, re, difflib, sys, os
 from typing import Dict, Any, List, Tuple, Optional, DefaultDict
 from collections import defaultdict
 
@@ -519,10 +519,9 @@ def ocr_global_assignment(expected: Dict[str, Any], barcode_text: str,
             json.dump(to_jsonable([{"key": k, "value": v} for k, v in expected_items]), f, indent=2, ensure_ascii=False)
         with open(os.path.join(debug_dir, "assignment_cols_pairs.json"), "w", encoding="utf-8") as f:
             json.dump(to_jsonable(pairs_ctx), f, indent=2, ensure_ascii=False)
+        # Formatted floats never need CSV quoting; join directly (csv.writer's \r\n kept)
         with open(os.path.join(debug_dir, "cost_matrix.csv"), "w", newline="", encoding="utf-8") as f:
-            w = csv.writer(f)
-            for row in C:
-                w.writerow([f"{x:.4f}" for x in row])
+            f.writelines(",".join([f"{x:.4f}" for x in row]) + "\r\n" for row in C)
 
     if HAS_SCIPY and C and C[0]:
         try:
@@ -18,12 +18,46 @@ Provider routing:
 
 from __future__ import annotations
 
-import os, re, sys, json, argparse, base64, mimetypes
+import os, re, sys, json, argparse, base64, hashlib, importlib.util, mimetypes, threading
+from bisect import bisect_left
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from functools import lru_cache
+from itertools import chain, islice
 from pathlib import Path
-from typing import Any, Callable, Dict, List, Optional, Tuple, Union
-from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple, Union
 from urllib import request as urllib_request, error as urllib_error
-from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, unquote, urlencode
+from urllib.request import getproxies, proxy_bypass
+
+try:  # optional: much faster JSON encoding for structured.json
+    import orjson  # type: ignore
+    HAS_ORJSON = True
+except Exception:
+    orjson = None  # type: ignore
+    HAS_ORJSON = False
+
+try:  # optional: faster content hashing for the response cache
+    import blake3  # type: ignore
+    HAS_BLAKE3 = True
+except Exception:
+    blake3 = None  # type: ignore
+    HAS_BLAKE3 = False
+
+try:  # optional: keep-alive connection pooling for raw HTTP providers
+    import urllib3  # type: ignore
+    HAS_URLLIB3 = True
+except Exception:
+    urllib3 = None  # type: ignore
+    HAS_URLLIB3 = False
+
+try:  # optional: SIMD base64 encoder for inline image payloads
+    import pybase64  # type: ignore
+    HAS_PYBASE64 = True
+except Exception:
+    pybase64 = None  # type: ignore
+    HAS_PYBASE64 = False
 
 # --------------------------
 # Constants
@@ -32,6 +66,7 @@ IMAGE_EXTS = {".jpg", ".jpeg", ".png", ".webp", ".bmp", ".tif", ".tiff"}
 DEFAULT_MODEL = "Qwen/Qwen3-VL-2B-Instruct"
 HF_ROUTER_BASE = "https://router.huggingface.co"  # kept for generic HTTP path if you ever need it
 DEFAULT_LOCAL_MAX_NEW_TOKENS = 512
+LOCAL_QUANT_MODES = ("none", "int8", "int4", "fp8")
 
 BASE_EXTRACTION_PROMPT = (
     "You are given a shipping/order IMAGE and its OCR transcript.\n"
@@ -41,6 +76,16 @@ BASE_EXTRACTION_PROMPT = (
     "Respond with a single JSON object that includes both keys. Do not wrap the output in code fences."
     
 )
+NO_OCR_TEXT = (
+    "No OCR transcript is available. Use the visual content of the image to extract header key/value pairs."
+)
+OUTPUT_JSON_TEXT = "OUTPUT: JSON only."
+
+# Static message parts shared by every request; only the image and OCR parts vary per image.
+# Treated as read-only: neither the SDK clients nor the raw HTTP path mutate message content.
+INSTRUCTION_PART: Dict[str, str] = {"type": "text", "text": BASE_EXTRACTION_PROMPT}
+NO_OCR_PART: Dict[str, str] = {"type": "text", "text": NO_OCR_TEXT}
+OUTPUT_JSON_PART: Dict[str, str] = {"type": "text", "text": OUTPUT_JSON_TEXT}
 
 # --------------------------
 # Config helpers
@@ -120,22 +165,40 @@ def append_query_params(url: str, params: Dict[str, Optional[str]]) -> str:
 # --------------------------
 # I/O utils
 # --------------------------
-def safe_mkdir(d: str):
+def safe_mkdir(d: str) -> None:
     """Create ``d`` (and parents) when a truthy path is supplied."""
     if d:
         Path(d).mkdir(parents=True, exist_ok=True)
 
+@lru_cache(maxsize=32)
+def _mime_for_ext(ext: str) -> str:
+    mime, _ = mimetypes.guess_type("x" + ext)
+    return mime or "image/jpeg"
+
 def guess_mime(p: str) -> str:
     """Best-effort MIME type detection for outgoing image payloads."""
-    mime, _ = mimetypes.guess_type(p)
-    return mime or "image/jpeg"
+    # mimetypes retries lower-cased suffixes itself, so keying on the raw suffix is exact
+    return _mime_for_ext(os.path.splitext(p)[1])
+
+# Multiple of 3 so each chunk encodes without padding and chunks concatenate cleanly
+B64_CHUNK_SIZE = 48 * 1024
+
+_b64encode = pybase64.b64encode if HAS_PYBASE64 else base64.b64encode
 
 def encode_image_to_base64(image_path: str) -> str:
     """Return a ``data:`` URI with the base64 encoded contents of ``image_path``."""
     # Keeping base64 data URI for compatibility — HF SDK handles large payloads via multipart/stream.
+    # Encode in chunks so the raw file is never held in memory next to its encoding.
+    buf = bytearray(b"data:")
+    buf += guess_mime(image_path).encode("ascii")
+    buf += b";base64,"
     with open(image_path, "rb") as f:
-        b64 = base64.b64encode(f.read()).decode("utf-8")
-    return f"data:{guess_mime(image_path)};base64,{b64}"
+        while True:
+            chunk = f.read(B64_CHUNK_SIZE)
+            if not chunk:
+                break
+            buf += _b64encode(chunk)
+    return buf.decode("ascii")
 
 # --------------------------
 # JSON path helpers
@@ -143,34 +206,40 @@ def encode_image_to_base64(image_path: str) -> str:
 def parse_path_tokens(path: str) -> List[Union[str, int]]:
     """Tokenise dotted/array JSON paths into index-aware components."""
     tokens: List[Union[str, int]] = []
-    buf = ""
-    i = 0
-    while i < len(path):
+    n = len(path)
+    start = i = 0  # ``start`` marks the beginning of the pending key segment
+    while i < n:
         ch = path[i]
-        if ch == ".":
-            if buf:
-                tokens.append(buf); buf = ""
+        if ch != "." and ch != "[":
             i += 1; continue
+        if i > start:
+            tokens.append(path[start:i])
         if ch == "[":
-            if buf:
-                tokens.append(buf); buf = ""
             j = path.find("]", i)
-            if j == -1: break
+            if j == -1:
+                return tokens
             idx_str = path[i+1:j].strip()
             if idx_str.isdigit():
                 tokens.append(int(idx_str))
-            i = j + 1; continue
-        buf += ch; i += 1
-    if buf:
-        tokens.append(buf)
+            i = j + 1
+        else:
+            i += 1
+        start = i
+    if n > start:
+        tokens.append(path[start:])
     return tokens
 
+@lru_cache(maxsize=64)
+def _cached_path_tokens(path: str) -> Tuple[Union[str, int], ...]:
+    """Memoised, immutable :func:`parse_path_tokens` for per-config response paths."""
+    return tuple(parse_path_tokens(path))
+
 def extract_json_path(data: Any, path: str) -> Any:
     """Traverse ``data`` by ``path`` (``foo.bar[0]`` style) returning ``None`` when missing."""
     if not path:
         return data
     current = data
-    for token in parse_path_tokens(path):
+    for token in _cached_path_tokens(path):
         if isinstance(token, int):
             if isinstance(current, (list, tuple)) and 0 <= token < len(current):
                 current = current[token]
@@ -215,6 +284,112 @@ def build_http_headers(remote_cfg: Dict[str, Any]) -> Dict[str, str]:
     headers.setdefault("Accept", "application/json")
     return headers
 
+# --------------------------
+# HTTP transport
+# --------------------------
+_HTTP_POOLS: Dict[str, Any] = {}
+_HTTP_POOLS_LOCK = threading.Lock()
+
+def _get_http_pool(url: str) -> Any:
+    """Return a shared urllib3 pool for ``url`` (proxy aware), or ``None`` to use ``urlopen``.
+
+    Proxies are resolved the same way ``urlopen`` does (``*_PROXY`` /
+    ``NO_PROXY``), including ``user:pass@`` credentials, and one pool is kept
+    per proxy so keep-alive connections are reused across images and worker
+    threads. Proxies urllib3 cannot drive (e.g. ``socks5://``) fall back to
+    ``urlopen``, as does a missing urllib3.
+    """
+    if not HAS_URLLIB3:
+        return None
+    parts = urlsplit(url)
+    proxy = getproxies().get(parts.scheme or "http") or ""
+    if proxy and parts.hostname and proxy_bypass(parts.hostname):
+        proxy = ""
+    with _HTTP_POOLS_LOCK:
+        if proxy in _HTTP_POOLS:
+            return _HTTP_POOLS[proxy]
+        # Connection failures and 429s (honouring Retry-After) are retried; any
+        # other POST that reached the provider is never replayed.
+        retries = urllib3.Retry(
+            total=3,
+            connect=2,
+            read=0,
+            status=2,
+            status_forcelist=(429,),
+            allowed_methods=None,
+            backoff_factor=0.5,
+            raise_on_status=False,
+        )
+        if proxy:
+            proxy_url, proxy_headers = _split_proxy_auth(proxy)
+            try:
+                pool = urllib3.ProxyManager(
+                    proxy_url, num_pools=8, maxsize=32, retries=retries, proxy_headers=proxy_headers
+                )
+            except Exception as exc:
+                print(f"[warn] Proxy not supported by urllib3 ({exc}); using urllib.", file=sys.stderr)
+                pool = None
+        else:
+            pool = urllib3.PoolManager(num_pools=8, maxsize=32, retries=retries)
+        _HTTP_POOLS[proxy] = pool
+    return pool
+
+def _split_proxy_auth(proxy: str) -> Tuple[str, Optional[Dict[str, str]]]:
+    """Move ``user:pass@`` credentials from a proxy URL into a Proxy-Authorization header."""
+    if "://" not in proxy:
+        proxy = "http://" + proxy
+    parts = urlsplit(proxy)
+    if parts.username is None:
+        return proxy, None
+    host = parts.hostname or ""
+    if ":" in host:
+        host = f"[{host}]"
+    if parts.port is not None:
+        host = f"{host}:{parts.port}"
+    auth = f"{unquote(parts.username)}:{unquote(parts.password or '')}"
+    return urlunsplit((parts.scheme, host, parts.path, parts.query, parts.fragment)), urllib3.make_headers(
+        proxy_basic_auth=auth
+    )
+
+def http_post(url: str, data: bytes, headers: Dict[str, str], timeout_s: float) -> str:
+    """POST ``data`` and return the decoded body, raising ``RuntimeError`` on failure."""
+    try:
+        pool = _get_http_pool(url)
+    except Exception as exc:
+        raise RuntimeError(f"Request failed: {exc}") from exc
+    if pool is not None:
+        try:
+            resp = pool.request("POST", url, body=data, headers=headers, timeout=timeout_s)
+        except Exception as exc:
+            raise RuntimeError(f"Request failed: {exc}") from exc
+        text = resp.data.decode("utf-8", errors="ignore")
+        if resp.status >= 400:
+            raise RuntimeError(f"HTTP {resp.status}: {text[:200]}")
+        return text
+
+    req = urllib_request.Request(url, data=data, headers=headers, method="POST")
+    try:
+        with urllib_request.urlopen(req, timeout=timeout_s) as resp:
+            return resp.read().decode("utf-8", errors="ignore")
+    except urllib_error.HTTPError as exc:
+        detail = ""
+        try:
+            detail = exc.read().decode("utf-8", errors="ignore")
+        except Exception:
+            detail = str(exc)
+        raise RuntimeError(f"HTTP {exc.code}: {detail[:200]}") from exc
+    except Exception as exc:
+        raise RuntimeError(f"Request failed: {exc}") from exc
+
+def _payload_bytes(payload: Dict[str, Any]) -> bytes:
+    """Compact UTF-8 JSON request body; orjson avoids a str round trip for MB-sized data URIs."""
+    if HAS_ORJSON:
+        try:
+            return orjson.dumps(payload)
+        except TypeError:  # orjson.JSONEncodeError
+            pass
+    return json.dumps(payload).encode("utf-8")
+
 # --------------------------
 # Message builder
 # --------------------------
@@ -225,23 +400,48 @@ def build_vlm_messages(
 ) -> List[Dict[str, Any]]:
     """Create an OpenAI-compatible chat message payload for a single image scan."""
     img_b64 = encode_image_to_base64(image_path)
-    instruction = BASE_EXTRACTION_PROMPT
+    cleaned_txt = (ocr_txt or "").strip()
     user_content = [
-        {"type": "text", "text": instruction},
+        INSTRUCTION_PART,
         {"type": "image_url", "image_url": {"url": img_b64}},
+        {"type": "text", "text": "OCR_TEXT_BEGIN\n" + cleaned_txt + "\nOCR_TEXT_END"} if cleaned_txt else NO_OCR_PART,
+        OUTPUT_JSON_PART,
     ]
+    messages: List[Dict[str, Any]] = []
+    if system_prompt:
+        messages.append({"role": "system", "content": system_prompt})
+    messages.append({"role": "user", "content": user_content})
+    return messages
+
+BATCH_RESULTS_KEY = "images"
+
+def build_vlm_batch_messages(
+    image_paths: List[str],
+    ocr_txt: Optional[str] = None,
+    system_prompt: Optional[str] = None,
+) -> List[Dict[str, Any]]:
+    """Create one chat message covering several images (multi-image capable VLMs).
+
+    Each image is preceded by a label with its file name, and the model is
+    asked for ``{"images": [...]}`` with one extraction object per image, in
+    order. See :func:`split_batch_reply` for the inverse.
+    """
+    names = [os.path.basename(p) for p in image_paths]
+    batch_instruction = (
+        f"You are given {len(image_paths)} IMAGES. Apply the instructions above to each image independently.\n"
+        f"Respond with a single JSON object {{\"{BATCH_RESULTS_KEY}\": [...]}} holding one object per image, "
+        "in the order the images appear. Each object must include an \"image\" key set to the file name "
+        "shown before that image, next to its \"all_key_values\" and \"selected_key_values\"."
+    )
+    user_content: List[Dict[str, Any]] = [INSTRUCTION_PART, {"type": "text", "text": batch_instruction}]
+    for idx, (path, name) in enumerate(zip(image_paths, names), start=1):
+        user_content.append({"type": "text", "text": f"IMAGE {idx}: {name}"})
+        user_content.append({"type": "image_url", "image_url": {"url": encode_image_to_base64(path)}})
     cleaned_txt = (ocr_txt or "").strip()
-    if cleaned_txt:
-        user_content.append({"type": "text", "text": "OCR_TEXT_BEGIN\n" + cleaned_txt + "\nOCR_TEXT_END"})
-    else:
-        user_content.append({
-            "type": "text",
-            "text": (
-                "No OCR transcript is available. Use the visual content of the image to"
-                " extract header key/value pairs."
-            ),
-        })
-    user_content.append({"type": "text", "text": "OUTPUT: JSON only."})
+    user_content.append(
+        {"type": "text", "text": "OCR_TEXT_BEGIN\n" + cleaned_txt + "\nOCR_TEXT_END"} if cleaned_txt else NO_OCR_PART
+    )
+    user_content.append(OUTPUT_JSON_PART)
     messages: List[Dict[str, Any]] = []
     if system_prompt:
         messages.append({"role": "system", "content": system_prompt})
@@ -258,6 +458,17 @@ def parse_bool(value: Optional[str], default: bool = False) -> bool:
         return bool(value)
     return str(value).strip().lower() in {"1", "true", "yes", "on"}
 
+def env_int(name: str, default: int) -> int:
+    """Read an integer environment override, warning and falling back on bad values."""
+    raw = (os.environ.get(name) or "").strip()
+    if not raw:
+        return default
+    try:
+        return int(raw)
+    except ValueError:
+        print(f"[warn] Ignoring invalid {name}={raw!r}; using {default}.", file=sys.stderr)
+        return default
+
 def compose_prompt_text(system_prompt: Optional[str], ocr_txt: Optional[str]) -> str:
     """Build the human-readable prompt text shared with CLI logging paths."""
     parts: List[str] = []
@@ -270,12 +481,84 @@ def compose_prompt_text(system_prompt: Optional[str], ocr_txt: Optional[str]) ->
     if cleaned_txt:
         parts.append("OCR_TEXT_BEGIN\n" + cleaned_txt + "\nOCR_TEXT_END")
     else:
-        parts.append(
-            "No OCR transcript is available. Use the visual content of the image to extract header key/value pairs."
-        )
-    parts.append("OUTPUT: JSON only.")
+        parts.append(NO_OCR_TEXT)
+    parts.append(OUTPUT_JSON_TEXT)
     return "\n\n".join(parts)
 
+JSON_DONE_KEY = "selected_key_values"
+
+class _JsonDoneTracker:
+    """Incrementally scan generated text and report when the reply's JSON is complete.
+
+    The reply is complete once a top-level ``{...}`` that mentions
+    ``JSON_DONE_KEY`` is balanced. The prompt asks for "two JSON bodies", and
+    small models sometimes emit ``all_key_values`` and ``selected_key_values``
+    as two separate objects, so a closed object without that key keeps
+    generating. Brackets inside strings and inside ``<think>`` blocks are
+    ignored, and only ``{`` opens a top-level value.
+    """
+
+    __slots__ = ("depth", "in_string", "escape", "in_think", "tail", "text", "has_key", "done")
+
+    def __init__(self) -> None:
+        self.depth = 0
+        self.in_string = False
+        self.escape = False
+        self.in_think = False
+        self.tail = ""
+        self.text = ""
+        self.has_key = False
+        self.done = False
+
+    def feed(self, text: str) -> bool:
+        for ch in text:
+            if self.in_string:
+                if self.escape:
+                    self.escape = False
+                elif ch == "\\":
+                    self.escape = True
+                elif ch == '"':
+                    self.in_string = False
+                    if self.text == JSON_DONE_KEY:
+                        self.has_key = True
+                    continue
+                # Only a string as long as the key can match; stop buffering past it
+                if len(self.text) <= len(JSON_DONE_KEY):
+                    self.text += ch
+                continue
+            if ch == ">":
+                marker = (self.tail + ch).lower()
+                if marker.endswith("<think>"):
+                    self.in_think = True
+                elif marker.endswith("</think>"):
+                    self.in_think = False
+            self.tail = (self.tail + ch)[-8:]
+            if self.in_think:
+                continue
+            if ch == "{" or (ch == "[" and self.depth):
+                self.depth += 1
+            elif ch in "}]" and self.depth:
+                self.depth -= 1
+                if not self.depth:
+                    if self.has_key:
+                        self.done = True
+                        return True
+            elif ch == '"' and self.depth:
+                self.in_string = True
+                self.text = ""
+        return False
+
+def _is_compile_error(exc: BaseException) -> bool:
+    """True when ``exc`` (or its cause) was raised by TorchDynamo / Inductor."""
+    seen = 0
+    current: Optional[BaseException] = exc
+    while current is not None and seen < 8:
+        if type(current).__module__.startswith(("torch._dynamo", "torch._inductor")):
+            return True
+        current = current.__cause__ or current.__context__
+        seen += 1
+    return False
+
 def build_local_vlm_call(
     model_id: str,
     dtype: str,
@@ -283,8 +566,31 @@ def build_local_vlm_call(
     max_new_tokens: int,
     attn_impl: Optional[str],
     system_prompt: Optional[str],
+    quant: Optional[str] = None,
+    json_stop: bool = True,
+    compile_model: bool = False,
+    max_pixels: Optional[int] = None,
+    gpu_decode: bool = False,
+    tile_rows: int = 1,
+    tile_overlap: int = 64,
 ) -> Callable[[str, Optional[str]], str]:
-    """Instantiate a callable that runs the local VLM and returns decoded text."""
+    """Instantiate a callable that runs the local VLM and returns decoded text.
+
+    ``quant`` (``"int8"`` / ``"int4"``) loads the language model weights through
+    bitsandbytes on CUDA, and ``"fp8"`` uses transformers' FP8 kernels on
+    sm_89+ GPUs; the vision tower and ``lm_head`` stay in half precision.
+    With ``json_stop`` generation ends as soon as the JSON object holding
+    ``selected_key_values`` is closed instead of running on to
+    ``max_new_tokens`` when EOS never comes.
+    ``compile_model`` wraps the forward pass in ``torch.compile`` on CUDA; the
+    first generation pays the compile cost. ``max_pixels`` caps the image area
+    the processor resizes to, rounded down to whole vision patches.
+    ``gpu_decode`` decodes JPEGs with nvJPEG straight into CUDA tensors when the
+    processor is a torch-based ("fast") image processor. ``tile_rows > 1``
+    splits tall pages (height at least twice the width) into that many
+    overlapping horizontal strips, runs them as one batch and merges the
+    extracted pairs (see :func:`merge_kv_replies`).
+    """
     try:
         import torch
     except ImportError as ie:
@@ -303,6 +609,11 @@ def build_local_vlm_call(
             "transformers is required for local VLM execution. Install with: pip install transformers"
         ) from ie
 
+    try:
+        from transformers import StoppingCriteria, StoppingCriteriaList  # type: ignore
+    except ImportError:
+        StoppingCriteria = StoppingCriteriaList = None  # type: ignore
+
     try:
         from transformers import Qwen2VLForConditionalGeneration  # type: ignore
     except ImportError:
@@ -357,14 +668,70 @@ def build_local_vlm_call(
                 device_map_value = device_map_clean or lowered_map
 
     attn_impl_clean = (attn_impl or "").strip()
+    attn_auto_flash = False
     if not attn_impl_clean:
         try:
             if torch.cuda.is_available():
                 attn_impl_clean = "sdpa"
+                # FlashAttention-2 needs the flash_attn package, Ampere+ and a half-precision dtype
+                if (
+                    torch_dtype in (torch.float16, torch.bfloat16)
+                    and importlib.util.find_spec("flash_attn") is not None
+                    and torch.cuda.get_device_capability()[0] >= 8
+                ):
+                    attn_impl_clean = "flash_attention_2"
+                    attn_auto_flash = True
         except Exception:
             pass
     tokens = max(1, int(max_new_tokens or DEFAULT_LOCAL_MAX_NEW_TOKENS))
 
+    quant_key = (quant or "none").strip().lower()
+    quant_config: Any = None
+    if quant_key not in LOCAL_QUANT_MODES:
+        print(f"[warn] Unsupported quantization '{quant}'. Loading unquantized weights.", file=sys.stderr)
+    elif quant_key != "none":
+        try:
+            cuda_ok = torch.cuda.is_available()
+        except Exception:
+            cuda_ok = False
+        skip_modules = ["visual", "lm_head"]
+        if not cuda_ok:
+            print(f"[warn] {quant_key} quantization needs CUDA; loading unquantized weights.", file=sys.stderr)
+        elif quant_key == "fp8":
+            # FP8 tensor cores start with Ada/Hopper (sm_89+); older cards would only emulate it
+            if tuple(torch.cuda.get_device_capability()) < (8, 9):
+                print("[warn] fp8 needs an Ada/Hopper GPU (sm_89+); loading unquantized weights.", file=sys.stderr)
+            else:
+                try:
+                    from transformers import FineGrainedFP8Config  # type: ignore
+                except ImportError as ie:
+                    raise RuntimeError(
+                        "fp8 quantization needs a newer transformers. Install with: pip install -U transformers"
+                    ) from ie
+                # Dynamic E4M3 activations + weights for the decoder linears; vision tower stays half precision
+                quant_config = FineGrainedFP8Config(modules_to_not_convert=skip_modules)
+                print("[info] Local VLM quantization: fp8 (E4M3, dynamic activations)", file=sys.stderr)
+        else:
+            try:
+                from transformers import BitsAndBytesConfig  # type: ignore
+                import bitsandbytes  # type: ignore  # noqa: F401
+            except ImportError as ie:
+                raise RuntimeError(
+                    "bitsandbytes is required for quantized local models. Install with: pip install bitsandbytes"
+                ) from ie
+            # Weight-only quantization of the decoder; the vision encoder is slower when quantized.
+            if quant_key == "int4":
+                compute_dtype = torch_dtype if torch_dtype in (torch.float16, torch.bfloat16) else torch.float16
+                quant_config = BitsAndBytesConfig(
+                    load_in_4bit=True,
+                    bnb_4bit_compute_dtype=compute_dtype,
+                    bnb_4bit_quant_type="nf4",
+                    bnb_4bit_use_double_quant=True,
+                    llm_int8_skip_modules=skip_modules,
+                )
+            else:
+                quant_config = BitsAndBytesConfig(load_in_8bit=True, llm_int8_skip_modules=skip_modules)
+
     loaders: List[Any] = []
     lowered = normalized_model.lower()
     if "qwen3" in lowered and Qwen3VLForConditionalGeneration is not None:
@@ -386,9 +753,19 @@ def build_local_vlm_call(
             base_kwargs["torch_dtype"] = torch_dtype
         if attn_impl_clean:
             base_kwargs["attn_implementation"] = attn_impl_clean
+        if quant_config is not None:
+            base_kwargs["quantization_config"] = quant_config
 
         try:
             return loader.from_pretrained(normalized_model, **base_kwargs)
+        except (ImportError, ValueError) as exc:
+            # An auto-selected flash_attention_2 that the install cannot honour falls back to SDPA;
+            # anything else (e.g. a bitsandbytes / FP8 config error) is a real load failure
+            if not attn_auto_flash or "flash" not in str(exc).lower():
+                raise
+            print(f"[warn] flash_attention_2 unavailable ({exc}); using sdpa.", file=sys.stderr)
+            base_kwargs["attn_implementation"] = "sdpa"
+            return loader.from_pretrained(normalized_model, **base_kwargs)
         except TypeError as exc:
             msg = str(exc).lower()
             adjusted = dict(base_kwargs)
@@ -422,7 +799,36 @@ def build_local_vlm_call(
 
     model.eval()
 
+    eager_forward = None
+    compile_lock = threading.Lock()
+    if compile_model:
+        try:
+            cuda_ok = torch.cuda.is_available()
+        except Exception:
+            cuda_ok = False
+        if cuda_ok and hasattr(torch, "compile"):
+            # Compile forward rather than the module so model.generate() uses it
+            eager_forward = model.forward
+            model.forward = torch.compile(eager_forward, mode="reduce-overhead", dynamic=True)
+        else:
+            print("[warn] torch.compile needs CUDA and torch>=2.0; running eager.", file=sys.stderr)
+
     processor = AutoProcessor.from_pretrained(normalized_model, trust_remote_code=True)
+    image_processor = getattr(processor, "image_processor", None)
+    if max_pixels and image_processor is not None:
+        # Qwen-style processors resize to multiples of patch_size * merge_size
+        # (28 for Qwen2-VL, 32 for Qwen3-VL); snap the budget to whole patches.
+        patch = int(getattr(image_processor, "patch_size", 14) or 14)
+        merge = int(getattr(image_processor, "merge_size", 2) or 2)
+        unit = (patch * merge) ** 2
+        budget = max(4 * unit, (int(max_pixels) // unit) * unit)
+        if hasattr(image_processor, "max_pixels"):
+            image_processor.max_pixels = budget
+        size = getattr(image_processor, "size", None)
+        if isinstance(size, dict) and "longest_edge" in size:
+            size["longest_edge"] = budget
+            if size.get("shortest_edge", 0) > budget:
+                size["shortest_edge"] = budget
     tokenizer = getattr(processor, "tokenizer", None)
     if tokenizer is not None and getattr(tokenizer, "pad_token_id", None) is None:
         eos_id = getattr(tokenizer, "eos_token_id", None)
@@ -439,7 +845,52 @@ def build_local_vlm_call(
 
     prompt_cache = system_prompt
 
+    # The closure may be called from several threads (the local service's
+    # --max-concurrent). Qwen-VL models keep per-call state such as
+    # rope_deltas on the module between prefill and decode, so generate()
+    # runs one call at a time; the fast tokenizer is reconfigured per call
+    # (padding) and raises "Already borrowed" when shared, so every use of it
+    # goes through tokenizer_lock. Image decoding and uploads still overlap.
+    generate_lock = threading.Lock()
+    tokenizer_lock = threading.RLock()
+
+    # Host-to-device copies go through pinned memory on a side stream so they
+    # do not serialise behind the compute stream. Each compute stream (the
+    # local service gives each concurrent request its own stream) gets its
+    # own copy stream, so one request never waits on another's uploads.
+    copy_streams: Dict[int, Any] = {}
+    copy_streams_lock = threading.Lock()
+
+    def copy_stream_for(compute_stream: Any) -> Any:
+        key = compute_stream.cuda_stream
+        with copy_streams_lock:
+            stream = copy_streams.get(key)
+            if stream is None:
+                stream = torch.cuda.Stream(device=target_device)
+                copy_streams[key] = stream
+        return stream
+
+    def copy_pinned(value: Any, compute_stream: Any) -> Any:
+        if not isinstance(value, torch.Tensor):
+            return value
+        if value.device.type == "cpu":
+            value = value.pin_memory()
+        moved = value.to(target_device, non_blocking=True)
+        # Allocated on the copy stream but consumed on the compute stream
+        moved.record_stream(compute_stream)
+        return moved
+
     def move_batch(batch: Any) -> Any:
+        if target_device.type == "cuda" and hasattr(batch, "items"):
+            try:
+                compute_stream = torch.cuda.current_stream(target_device)
+                copy_stream = copy_stream_for(compute_stream)
+                with torch.cuda.stream(copy_stream):
+                    moved = {k: copy_pinned(v, compute_stream) for k, v in batch.items()}
+                compute_stream.wait_stream(copy_stream)
+                return moved
+            except Exception:
+                pass
         if hasattr(batch, "to"):
             try:
                 return batch.to(target_device, non_blocking=True)
@@ -449,61 +900,225 @@ def build_local_vlm_call(
             return {k: move_batch(v) for k, v in batch.items()}
         return batch
 
-    def local_vlm(image_path: str, ocr_txt: Optional[str]) -> str:
+    if tokenizer is not None:
+        # Decoder-only generation needs left padding so batched prompts end together
+        try:
+            tokenizer.padding_side = "left"
+        except Exception:
+            pass
+
+    decode_jpeg = None
+    if gpu_decode:
+        # A slow (numpy) image processor would copy the tensor straight back to the host
+        fast_processor = type(image_processor).__name__.endswith("Fast")
+        if target_device.type == "cuda" and fast_processor:
+            try:
+                from torchvision.io import ImageReadMode, decode_jpeg as _decode_jpeg, read_file
+
+                def decode_jpeg(image_path: str) -> Any:
+                    return _decode_jpeg(read_file(image_path), mode=ImageReadMode.RGB, device=target_device)
+            except ImportError:
+                print("[warn] GPU JPEG decode needs torchvision; decoding with PIL.", file=sys.stderr)
+        else:
+            print("[warn] GPU JPEG decode needs CUDA and a fast image processor; decoding with PIL.", file=sys.stderr)
+
+    # Decode upcoming images on a side thread while the current one is on the GPU.
+    prefetch_pool = ThreadPoolExecutor(max_workers=2)
+    prefetched: Dict[str, Any] = {}
+    prefetch_window = 1
+
+    def load_image(image_path: str) -> Any:
+        # Same steps as transformers' load_image: honour EXIF orientation, then RGB
+        from PIL import Image, ImageOps
+
+        with Image.open(image_path) as img:
+            # nvJPEG ignores EXIF, so only upright JPEGs take the GPU path
+            if decode_jpeg is not None and img.format == "JPEG" and img.getexif().get(0x0112, 1) == 1:
+                try:
+                    return decode_jpeg(image_path)
+                except Exception:
+                    pass
+            return ImageOps.exif_transpose(img).convert("RGB")
+
+    def prefetch(image_paths: List[str]) -> None:
+        nonlocal prefetch_window
+        for path in image_paths:
+            if path not in prefetched:
+                prefetched[path] = prefetch_pool.submit(load_image, path)
+        # Cache hits never consume their entry; keep the current and upcoming chunk only
+        prefetch_window = max(prefetch_window, len(image_paths))
+        while len(prefetched) > 2 * prefetch_window:
+            prefetched.pop(next(iter(prefetched))).cancel()
+
+    def image_for(image_path: str) -> Any:
+        future = prefetched.pop(image_path, None)
+        if future is None:
+            if decode_jpeg is None:
+                return image_path
+            future = prefetch_pool.submit(load_image, image_path)
+        try:
+            return future.result()
+        except Exception:
+            # Let the processor load it and report the error in its own terms
+            return image_path
+
+    def build_messages(image: Any, ocr_txt: Optional[str]) -> List[Dict[str, Any]]:
         cleaned_txt = (ocr_txt or "").strip()
         user_content: List[Dict[str, Any]] = [
-            {"type": "image", "image": image_path},
-            {"type": "text", "text": BASE_EXTRACTION_PROMPT},
+            {"type": "image", "image": image} if image is not None else {"type": "image"},
+            INSTRUCTION_PART,
+            {"type": "text", "text": "OCR_TEXT_BEGIN\n" + cleaned_txt + "\nOCR_TEXT_END"} if cleaned_txt else NO_OCR_PART,
+            OUTPUT_JSON_PART,
         ]
-        if cleaned_txt:
-            user_content.append({"type": "text", "text": "OCR_TEXT_BEGIN\n" + cleaned_txt + "\nOCR_TEXT_END"})
-        else:
-            user_content.append(
-                {
-                    "type": "text",
-                    "text": (
-                        "No OCR transcript is available. Use the visual content of the image to"
-                        " extract header key/value pairs."
-                    ),
-                }
-            )
-        user_content.append({"type": "text", "text": "OUTPUT: JSON only."})
 
         messages: List[Dict[str, Any]] = []
         if prompt_cache:
             messages.append({"role": "system", "content": prompt_cache})
         messages.append({"role": "user", "content": user_content})
+        return messages
+
+    @lru_cache(maxsize=8)
+    def prompt_text(ocr_txt: Optional[str]) -> str:
+        # The rendered chat template only varies with the OCR hint; images are placeholders
+        with tokenizer_lock:
+            return processor.apply_chat_template(
+                build_messages(None, ocr_txt), tokenize=False, add_generation_prompt=True
+            )
 
+    def prepare_inputs(image_paths: List[str], ocr_txt: Optional[str]) -> Any:
+        """Tokenise a (batch of) prompt(s), reusing the rendered template across images."""
         try:
-            token_inputs = processor.apply_chat_template(
-                messages,
-                tokenize=True,
-                add_generation_prompt=True,
-                return_dict=True,
+            images = []
+            for path in image_paths:
+                image = image_for(path)
+                images.append(load_image(image) if isinstance(image, str) else image)
+            text = prompt_text(ocr_txt)
+            with tokenizer_lock:
+                return processor(
+                    text=[text] * len(images),
+                    images=images,
+                    return_tensors="pt",
+                    padding=len(images) > 1,
+                )
+        except Exception:
+            # Fall back to the processor's own template + image loading
+            with tokenizer_lock:
+                return processor.apply_chat_template(
+                    [build_messages(path, ocr_txt) for path in image_paths],
+                    tokenize=True,
+                    add_generation_prompt=True,
+                    return_dict=True,
+                    return_tensors="pt",
+                    padding=len(image_paths) > 1,
+                )
+
+    def tile_image(image: Any) -> List[Any]:
+        size = getattr(image, "size", None)
+        if tile_rows <= 1 or not isinstance(size, tuple) or not hasattr(image, "crop"):
+            return [image]
+        width, height = size
+        if height < 2 * width:
+            return [image]
+        strip = -(-height // tile_rows)
+        overlap = max(0, int(tile_overlap))
+        tiles = []
+        for row in range(tile_rows):
+            top = max(0, row * strip - overlap)
+            bottom = min(height, (row + 1) * strip + overlap)
+            if top < bottom:
+                tiles.append(image.crop((0, top, width, bottom)))
+        return tiles
+
+    def tiled_vlm(image_path: str, ocr_txt: Optional[str]) -> Optional[str]:
+        """Run a tall page as a batch of strips; ``None`` when it is not tiled."""
+        image = image_for(image_path)
+        if isinstance(image, str):
+            image = load_image(image)
+        tiles = tile_image(image)
+        if len(tiles) < 2:
+            return None
+        text = prompt_text(ocr_txt)
+        with tokenizer_lock:
+            token_inputs = processor(
+                text=[text] * len(tiles),
+                images=tiles,
                 return_tensors="pt",
+                padding=True,
             )
-        except Exception as exc:
-            raise RuntimeError(f"Failed to prepare inputs for {image_path}: {exc}") from exc
+        return merge_kv_replies(generate_texts(token_inputs))
+
+    # Generation settings are fixed for the lifetime of the model; resolve them once.
+    gen_kwargs: Dict[str, Any] = {"max_new_tokens": tokens, "use_cache": True, "do_sample": False}
+    eos_id = getattr(tokenizer, "eos_token_id", None)
+    pad_id = getattr(tokenizer, "pad_token_id", None)
+    if eos_id is not None:
+        gen_kwargs["eos_token_id"] = eos_id
+    if pad_id is not None:
+        gen_kwargs["pad_token_id"] = pad_id
+    # Some checkpoints ship use_cache=False in their config; decoding without the
+    # KV cache recomputes every past key/value per step.
+    for cfg in (getattr(model, "config", None), getattr(model, "generation_config", None)):
+        if cfg is not None and getattr(cfg, "use_cache", True) is False:
+            try:
+                cfg.use_cache = True
+            except Exception:
+                pass
 
+    json_stop_enabled = json_stop and StoppingCriteria is not None and tokenizer is not None
+
+    if json_stop_enabled:
+        class JsonDoneCriteria(StoppingCriteria):  # type: ignore[misc, valid-type]
+            """Stop each row once its generated JSON value is balanced."""
+
+            def __init__(self, prompt_len: int, batch: int):
+                self.pos = prompt_len
+                self.trackers = [_JsonDoneTracker() for _ in range(batch)]
+
+            def __call__(self, input_ids: Any, scores: Any, **kwargs: Any) -> Any:
+                end = input_ids.shape[-1]
+                # Only the tokens added since the last step are decoded
+                new_ids = input_ids[:, self.pos:end].tolist()
+                self.pos = end
+                for tracker, ids in zip(self.trackers, new_ids):
+                    if not tracker.done:
+                        with tokenizer_lock:
+                            piece = tokenizer.decode(ids, skip_special_tokens=True)
+                        tracker.feed(piece)
+                return torch.tensor([t.done for t in self.trackers], dtype=torch.bool, device=input_ids.device)
+
+    def generate_texts(token_inputs: Any) -> List[str]:
         inputs = move_batch(token_inputs)
         if not isinstance(inputs, dict):
             inputs = dict(inputs)
 
-        gen_kwargs: Dict[str, Any] = {"max_new_tokens": tokens}
-        eos_id = getattr(tokenizer, "eos_token_id", None)
-        pad_id = getattr(tokenizer, "pad_token_id", None)
-        if eos_id is not None:
-            gen_kwargs["eos_token_id"] = eos_id
-        if pad_id is not None:
-            gen_kwargs["pad_token_id"] = pad_id
-        gen_kwargs.setdefault("use_cache", True)
-        gen_kwargs.setdefault("do_sample", False)
+        call_kwargs = gen_kwargs
+        prompt_ids = inputs.get("input_ids")
+        if json_stop_enabled and prompt_ids is not None:
+            call_kwargs = dict(gen_kwargs)
+            call_kwargs["stopping_criteria"] = StoppingCriteriaList(
+                [JsonDoneCriteria(prompt_ids.shape[-1], prompt_ids.shape[0])]
+            )
 
+        nonlocal eager_forward
+        ran_compiled = eager_forward is not None
         try:
-            with torch.inference_mode():
-                generated = model.generate(**inputs, **gen_kwargs)
+            with generate_lock, torch.inference_mode():
+                generated = model.generate(**inputs, **call_kwargs)
         except Exception as exc:
-            raise RuntimeError(f"Generation failed: {exc}") from exc
+            # Only compiler failures fall back; OOM and friends must not disable compile for good
+            if not ran_compiled or not _is_compile_error(exc):
+                raise RuntimeError(f"Generation failed: {exc}") from exc
+            with compile_lock:
+                # Another thread may have swapped already
+                if eager_forward is not None:
+                    print(f"[warn] torch.compile failed ({exc}); running eager.", file=sys.stderr)
+                    model.forward = eager_forward
+                    eager_forward = None
+            try:
+                with generate_lock, torch.inference_mode():
+                    generated = model.generate(**inputs, **call_kwargs)
+            except Exception as exc2:
+                raise RuntimeError(f"Generation failed: {exc2}") from exc2
 
         input_ids = inputs.get("input_ids") if isinstance(inputs, dict) else getattr(inputs, "input_ids", None)
         trimmed_sequences: List[Any] = []
@@ -520,17 +1135,57 @@ def build_local_vlm_call(
             trimmed_sequences = list(generated)
 
         try:
-            decoded = processor.batch_decode(
-                trimmed_sequences,
-                skip_special_tokens=True,
-                clean_up_tokenization_spaces=False,
-            )
+            with tokenizer_lock:
+                decoded = processor.batch_decode(
+                    trimmed_sequences,
+                    skip_special_tokens=True,
+                    clean_up_tokenization_spaces=False,
+                )
         except Exception as exc:
             raise RuntimeError(f"Decoding failed: {exc}") from exc
 
+        return [text.strip() for text in decoded]
+
+    def local_vlm(image_path: str, ocr_txt: Optional[str]) -> str:
+        if tile_rows > 1:
+            try:
+                tiled = tiled_vlm(image_path, ocr_txt)
+            except Exception as exc:
+                print(f"[warn] Tiled inference failed for {image_path} ({exc}); using the full page", file=sys.stderr)
+                tiled = None
+            if tiled is not None:
+                return tiled
+        try:
+            token_inputs = prepare_inputs([image_path], ocr_txt)
+        except Exception as exc:
+            raise RuntimeError(f"Failed to prepare inputs for {image_path}: {exc}") from exc
+
+        decoded = generate_texts(token_inputs)
         if not decoded:
             return ""
-        return decoded[0].strip()
+        return decoded[0]
+
+    def local_vlm_batch(image_paths: List[str], ocr_txt: Optional[str]) -> List[str]:
+        """Run one padded forward pass over several images."""
+        if not image_paths:
+            return []
+        if len(image_paths) == 1 or tile_rows > 1:
+            # Tiled pages already fill a batch of their own
+            return [local_vlm(path, ocr_txt) for path in image_paths]
+        try:
+            token_inputs = prepare_inputs(image_paths, ocr_txt)
+        except Exception as exc:
+            raise RuntimeError(f"Failed to prepare batched inputs: {exc}") from exc
+
+        decoded = generate_texts(token_inputs)
+        if len(decoded) != len(image_paths):
+            raise RuntimeError(
+                f"Batched generation returned {len(decoded)} outputs for {len(image_paths)} images"
+            )
+        return decoded
+
+    local_vlm.batch = local_vlm_batch  # type: ignore[attr-defined]
+    local_vlm.prefetch = prefetch  # type: ignore[attr-defined]
 
     return local_vlm
 
@@ -794,24 +1449,10 @@ def call_http_vlm(
     timeout_ms = remote_cfg.get("requestTimeoutMs")
     timeout_s = max(1.0, float(timeout_ms) / 1000.0) if isinstance(timeout_ms, (int, float)) else 30.0
 
-    data = json.dumps(payload).encode("utf-8")
-    req = urllib_request.Request(request_url, data=data, headers=headers, method="POST")
+    raw = http_post(request_url, _payload_bytes(payload), headers, timeout_s)
 
     try:
-        with urllib_request.urlopen(req, timeout=timeout_s) as resp:
-            raw = resp.read().decode("utf-8", errors="ignore")
-    except urllib_error.HTTPError as exc:
-        detail = ""
-        try:
-            detail = exc.read().decode("utf-8", errors="ignore")
-        except Exception:
-            detail = str(exc)
-        raise RuntimeError(f"HTTP {exc.code}: {detail[:200]}") from exc
-    except Exception as exc:
-        raise RuntimeError(f"Request failed: {exc}") from exc
-
-    try:
-        parsed = json.loads(raw)
+        parsed = _json_loads(raw)
     except Exception:
         return raw
 
@@ -858,26 +1499,72 @@ def to_str_content(msg: Any) -> str:
 # --------------------------
 # Universal KV parser
 # --------------------------
-CODE_FENCE_RE = re.compile(r"^```(?:json|JSON)?\s*|\s*```$", re.S)
-SMART_QUOTES_RE = str.maketrans({"“": '"', "”": '"', "‘": "'", "’": "'"})
+CODE_FENCE_OPEN_RE = re.compile(r"```(?:json|JSON)?\s*")
+PRECLEAN_TABLE = str.maketrans({"“": '"', "”": '"', "‘": "'", "’": "'", "\u00A0": " "})
+THINK_RE = re.compile(r"<think>.*?</think>", re.S | re.I)
+THINK_CLOSE_RE = re.compile(r"</think>", re.I)
+
+def _strip_code_fences(t: str) -> str:
+    """Drop a leading ```json fence and a trailing ``` fence (with adjacent whitespace).
+
+    A ``\s*```$`` regex would retry from every char of a long whitespace run,
+    so the closing fence is trimmed with ``rstrip`` instead.
+    """
+    start = 0
+    m = CODE_FENCE_OPEN_RE.match(t)
+    if m:
+        start = m.end()
+    end = len(t)
+    if t.endswith("```") and end - 3 >= start:
+        end = max(start, len(t[:-3].rstrip()))
+    return t[start:end]
 
 def _preclean(text: str) -> str:
     """Normalise provider responses by stripping code fences and smart quotes."""
     t = text.strip()
-    t = CODE_FENCE_RE.sub("", t)
-    t = t.replace("\u00A0", " ")
-    t = t.translate(SMART_QUOTES_RE)
-    # Strip <think> blocks if any provider includes them
-    t = re.sub(r"<think>.*?</think>", "", t, flags=re.S|re.I)
-    return t.strip()
+    if "`" in t:
+        t = _strip_code_fences(t)
+    # Strip <think> blocks if any provider includes them. Only text up to the
+    # last </think> can hold a block; past it every <think> would rescan to the end.
+    if "<" in t:
+        last_close = None
+        for last_close in THINK_CLOSE_RE.finditer(t):
+            pass
+        if last_close is not None:
+            t = THINK_RE.sub("", t[:last_close.end()]) + t[last_close.end():]
+    # Smart quotes and NBSP are folded in a single translate pass
+    return t.translate(PRECLEAN_TABLE).strip()
 
 def _find_object_span(t: str) -> Optional[Tuple[int,int]]:
     """Locate the outermost JSON object boundaries in ``t`` if present."""
+    # Most replies are already a bare object; avoid scanning the text at all.
+    if t.startswith("{") and t.endswith("}"):
+        return 0, len(t)
     s = t.find("{")
-    e = t.rfind("}")
-    if s != -1 and e != -1 and e > s:
-        return s, e+1
-    return None
+    if s == -1:
+        return None
+    e = t.rfind("}", s + 1)
+    if e == -1:
+        return None
+    return s, e+1
+
+# orjson turns integers outside the 64-bit range into floats; such digit runs
+# (e.g. long numeric tracking IDs) are left to the stdlib parser
+LONG_DIGITS_RE = re.compile(r"\d{19}")
+
+def _json_loads(text: str) -> Any:
+    """``json.loads`` via orjson when available.
+
+    Anything orjson rejects (NaN, lone surrogates, ...) or could round (19+
+    digit numbers) goes through the stdlib parser, so the accepted inputs and
+    results are unchanged.
+    """
+    if HAS_ORJSON and not LONG_DIGITS_RE.search(text):
+        try:
+            return orjson.loads(text)
+        except orjson.JSONDecodeError:
+            pass
+    return json.loads(text)
 
 def try_json_load(text: str) -> Optional[dict]:
     """Best-effort JSON loader that trims non-JSON noise before parsing."""
@@ -892,47 +1579,116 @@ def try_json_load(text: str) -> Optional[dict]:
         # s,e are already proper slice bounds (end is exclusive)
         frag = t[s:e]
         try:
-            return json.loads(frag)
+            return _json_loads(frag)
         except Exception:
             pass
 
     # fallback: attempt to parse the whole thing
     try:
-        return json.loads(t)
+        return _json_loads(t)
     except Exception:
         return None
 
 
 # Regex patterns for JSON-ish pairs
-PAIR_STR_STR = re.compile(r'''
-    ["']\s*([^"']+?)\s*["']\s*:\s*["'](.*?)["']\s*(?=,|\n|\r|})
-''', re.S|re.X)
-
-PAIR_STR_BARE = re.compile(r'''
-    ["']\s*([^"']+?)\s*["']\s*:\s*
-    (?:
-        -?\d+(?:\.\d+)?         # number
-        |
-        [A-Za-z0-9_./:-]+       # token-ish date/time/ID
-    )
-''', re.X)
-
-PAIR_BARE_STR = re.compile(r'''
-    (?<!["'])                  # not preceded by a quote
-    \b([A-Za-z0-9 _./#-]+?)\b
-    \s*:\s*
-    ["'](.*?)["']\s*(?=,|\n|\r|})
-''', re.S|re.X)
-
-PAIR_BARE_BARE = re.compile(r'''
-    (?<!["'])
-    \b([A-Za-z0-9 _./#-]+?)\b
-    \s*:\s*
-    ([^,\n\r}]+)
-''', re.X)
+#
+# One alternation covers the four shapes ("key": "value", "key": bare,
+# key: "value", key: bare) so a left-to-right scan yields every pair in
+# document order; the named outer group (``m.lastgroup``) says which shape hit.
+# Keys use greedy character classes (``_trim`` drops the trailing whitespace
+# they may pick up). Bare keys are capped at 80 chars and must end in a word
+# char (which the old trailing ``\b`` implied); without the cap a long
+# colon-free run of words made every start position rescan to the end.
+#
+# A quoted value runs to the first quote followed by a delimiter. Matching that
+# inside the regex made every opening quote scan to the end of the text when no
+# such quote follows (e.g. '":' * n), i.e. quadratic time on hostile replies,
+# so the quoted-value shapes stop at the opening quote here and
+# :func:`_iter_pairs` finds the closing quote in a precomputed index instead.
+_PAIR_SHAPES = (
+    ("str_str", r'''
+        ["']\s*(?P<k1>[^"']+)["']\s*:\s*
+        ["']                        # value: see _iter_pairs
+    '''),
+    ("str_bare", r'''
+        ["']\s*(?P<k2>[^"']+)["']\s*:\s*
+        (?=[A-Za-z0-9_./:-])        # number or token-ish date/time/ID ...
+        (?P<v2>[^\s,}\n\r]+)        # ... taken up to the next delimiter
+    '''),
+    ("bare_str", r'''
+        (?<!["'])                  # not preceded by a quote
+        \b(?P<k3>[A-Za-z0-9 _./#-]{0,79}[A-Za-z0-9_])
+        \s*:\s*
+        ["']                        # value: see _iter_pairs
+    '''),
+    ("bare_bare", r'''
+        (?<!["'])
+        \b(?P<k4>[A-Za-z0-9 _./#-]{0,79}[A-Za-z0-9_])
+        \s*:\s*
+        (?P<v4>[^,\n\r}]+)
+    '''),
+)
+
+PAIR_ANY = re.compile("|".join(f"(?P<{name}>{pattern})" for name, pattern in _PAIR_SHAPES), re.X)
+# Each shape on its own, to retry the later ones at a position whose quoted value never closes
+PAIR_SHAPE_RES = {name: re.compile(pattern, re.X) for name, pattern in _PAIR_SHAPES}
+PAIR_SHAPE_ORDER = tuple(name for name, _ in _PAIR_SHAPES)
+
+# (key group, value group); ``None`` marks a quoted value found by _iter_pairs
+PAIR_GROUPS = {
+    "str_str": ("k1", None),
+    "str_bare": ("k2", "v2"),
+    "bare_str": ("k3", None),
+    "bare_bare": ("k4", "v4"),
+}
+
+# A quote that closes a quoted value: followed by optional whitespace and a delimiter
+VALUE_CLOSE_RE = re.compile(r"""["']\s*(?=,|\n|\r|})""")
+
+def _iter_pairs(region: str) -> Iterator[Tuple[str, str, str]]:
+    """Yield ``(shape, key, value)`` for each pair in ``region``, left to right.
+
+    Matches are exactly those of a single leftmost-first alternation whose
+    quoted values end at the first closing quote (see ``VALUE_CLOSE_RE``).
+    Closing quotes are indexed once, so looking up a value's end is a bisect
+    and the whole scan stays linear in ``len(region)``.
+    """
+    closes = [(m.start(), m.end()) for m in VALUE_CLOSE_RE.finditer(region)]
+    close_starts = [start for start, _ in closes]
+    pos = 0
+    while True:
+        m = PAIR_ANY.search(region, pos)
+        if m is None:
+            return
+        at = m.start()
+        first = PAIR_SHAPE_ORDER.index(m.lastgroup)
+        for shape in PAIR_SHAPE_ORDER[first:]:
+            hit = m if shape == m.lastgroup else PAIR_SHAPE_RES[shape].match(region, at)
+            if hit is None:
+                continue
+            key_group, value_group = PAIR_GROUPS[shape]
+            if value_group is not None:
+                yield shape, hit.group(key_group), hit.group(value_group)
+                pos = hit.end()
+                break
+            i = bisect_left(close_starts, hit.end())
+            if i == len(closes):
+                continue  # the quoted value never closes; try the next shape here
+            yield shape, hit.group(key_group), region[hit.end():closes[i][0]]
+            pos = closes[i][1]
+            break
+        else:
+            pos = at + 1
+
+WS_RE = re.compile(r"\s+")
+TRAILING_BRACKET_RE = re.compile(r"[}\]]\s*$")
 
 def _trim(v: str) -> str:
-    return re.sub(r"\s+", " ", v.strip())
+    s = v.strip()
+    # Every whitespace char except " " is non-printable, so this is exact
+    if "  " not in s and s.isprintable():
+        return s
+    return WS_RE.sub(" ", s)
 
 DATE_RE = re.compile(r"\b(\d{1,2})/(\d{1,2})/(\d{4})(?:\s+(\d{1,2}):(\d{2}))?\b")
 
@@ -940,29 +1696,39 @@ def _pad2(n: str) -> str:
     try: return f"{int(n):02d}"
     except Exception: return n
 
+def _date_repl(m: "re.Match[str]") -> str:
+    mm, dd, yyyy = _pad2(m.group(1)), _pad2(m.group(2)), m.group(3)
+    if m.group(4) and m.group(5):
+        hh, mi = _pad2(m.group(4)), _pad2(m.group(5))
+        return f"{mm}/{dd}/{yyyy} {hh}:{mi}"
+    return f"{mm}/{dd}/{yyyy}"
+
 def maybe_zero_pad_dates(val: str, normalize_dates: bool) -> str:
-    if not normalize_dates:
-        return _trim(val)
-    def repl(m: re.Match) -> str:
-        mm, dd, yyyy = _pad2(m.group(1)), _pad2(m.group(2)), m.group(3)
-        if m.group(4) and m.group(5):
-            hh, mi = _pad2(m.group(4)), _pad2(m.group(5))
-            return f"{mm}/{dd}/{yyyy} {hh}:{mi}"
-        return f"{mm}/{dd}/{yyyy}"
-    return DATE_RE.sub(repl, _trim(val))
+    v = _trim(val)
+    # DATE_RE needs a slash, so most values never have to enter the regex engine
+    if not normalize_dates or "/" not in v:
+        return v
+    return DATE_RE.sub(_date_repl, v)
+
+def _normalize_dates_bulk(d: Dict[str, str]) -> None:
+    """Apply :func:`maybe_zero_pad_dates` to every (already trimmed) value of ``d`` in place."""
+    for k, v in d.items():
+        # Same slash pre-check as maybe_zero_pad_dates, without a call per value
+        if "/" in v:
+            d[k] = maybe_zero_pad_dates(v, True)
 
 def _coerce_kv_dict(value: Any, normalize_dates: bool) -> Dict[str, str]:
     """Convert mixed JSON structures into a predictable string->string dict."""
-    out = OrderedDict()
+    out: Dict[str, str] = {}
 
-    def assign(k: Any, v: Any):
+    def assign(k: Any, v: Any) -> None:
         if k is None:
             return
         key = _trim(str(k))
         if not key:
             return
         val = "" if v is None else str(v)
-        out[key] = maybe_zero_pad_dates(val, normalize_dates)
+        out[key] = _trim(val)
 
     if isinstance(value, dict):
         for k, v in value.items():
@@ -976,13 +1742,36 @@ def _coerce_kv_dict(value: Any, normalize_dates: bool) -> Dict[str, str]:
                 k, v = item
                 assign(k, v)
 
-    return dict(out)
+    if normalize_dates:
+        _normalize_dates_bulk(out)
+    return out
+
+
+def _find_payload_keys(obj: Dict[str, Any]) -> Tuple[Any, Any]:
+    """Return the actual ``all_key_values`` / ``selected_key_values`` keys (any case).
+
+    Keys are scanned newest first so the last spelling wins, as with a
+    lowered lookup dict, and the scan stops once both have been seen.
+    """
+    all_key: Any = None
+    selected_key: Any = None
+    for k in reversed(obj):
+        lk = k.lower() if isinstance(k, str) else str(k).lower()
+        if lk == "all_key_values":
+            if all_key is None:
+                all_key = k
+        elif lk == "selected_key_values":
+            if selected_key is None:
+                selected_key = k
+        else:
+            continue
+        if all_key is not None and selected_key is not None:
+            break
+    return all_key, selected_key
 
 
 def _normalize_structured_payload(obj: Dict[str, Any], normalize_dates: bool) -> Dict[str, Dict[str, str]]:
-    lowered = {str(k).lower(): k for k in obj.keys()}
-    all_key = lowered.get("all_key_values")
-    selected_key = lowered.get("selected_key_values")
+    all_key, selected_key = _find_payload_keys(obj)
 
     all_dict = _coerce_kv_dict(obj.get(all_key), normalize_dates) if all_key else {}
     selected_dict = _coerce_kv_dict(obj.get(selected_key), normalize_dates) if selected_key else {}
@@ -996,95 +1785,424 @@ def _normalize_structured_payload(obj: Dict[str, Any], normalize_dates: bool) ->
     }
 
 
-def parse_universal_kv(llm_raw: str, normalize_dates: bool=True) -> Dict[str, Dict[str, str]]:
+def parse_universal_kv(
+    llm_raw: str,
+    normalize_dates: bool=True,
+    strict_json: bool=False,
+) -> Dict[str, Dict[str, str]]:
     """
     - Try strict JSON
     - Else, regex-extract pairs from the first object-like region or entire text
+      (skipped with ``strict_json``, e.g. when the provider runs in JSON mode:
+      a reply that is not usable JSON then yields empty results)
     - Preserve insertion order; last wins on duplicate keys
+
+    Results are memoised per reply (folder runs often see the same stock
+    answer many times); callers get fresh dicts they are free to mutate.
     """
-    j = try_json_load(llm_raw)
+    if not isinstance(llm_raw, str):
+        return _parse_universal_kv(llm_raw, normalize_dates, strict_json)
+    parsed = _parse_universal_kv_cached(llm_raw, normalize_dates, strict_json)
+    return {k: dict(v) for k, v in parsed.items()}
+
+
+@lru_cache(maxsize=1024)
+def _parse_universal_kv_cached(llm_raw: str, normalize_dates: bool, strict_json: bool) -> Dict[str, Dict[str, str]]:
+    return _parse_universal_kv(llm_raw, normalize_dates, strict_json)
+
+
+def _parse_universal_kv(llm_raw: str, normalize_dates: bool, strict_json: bool) -> Dict[str, Dict[str, str]]:
+    j: Any = try_json_load(llm_raw)
     if isinstance(j, dict):
         return _normalize_structured_payload(j, normalize_dates)
     if isinstance(j, list):
         for item in j:
             if isinstance(item, dict):
-                lowered = {str(k).lower(): k for k in item.keys()}
-                if "all_key_values" in lowered or "selected_key_values" in lowered:
+                all_key, selected_key = _find_payload_keys(item)
+                if all_key is not None or selected_key is not None:
                     return _normalize_structured_payload(item, normalize_dates)
         # Merge list of dicts or [key,value] pairs
-        out = OrderedDict()
+        out: Dict[str, str] = {}
         for item in j:
             if isinstance(item, dict):
                 for k, v in item.items():
-                    out[_trim(str(k))] = maybe_zero_pad_dates(_trim(str(v)), normalize_dates)
+                    out[_trim(str(k))] = _trim(str(v))
             elif isinstance(item, (list, tuple)) and len(item) == 2:
                 k, v = item
-                out[_trim(str(k))] = maybe_zero_pad_dates(_trim(str(v)), normalize_dates)
-        if out:
-            return {
-                "all_key_values": dict(out),
-                "selected_key_values": {},
-            }
+                out[_trim(str(k))] = _trim(str(v))
+        # The reply was valid JSON, so skip the regex fallback even when no pairs came out
+        if normalize_dates:
+            _normalize_dates_bulk(out)
+        return {
+            "all_key_values": out,
+            "selected_key_values": {},
+        }
+
+    if strict_json:
+        return {
+            "all_key_values": {},
+            "selected_key_values": {},
+        }
 
     t = _preclean(llm_raw)
-    region = t
+    region: str = t
     span = _find_object_span(t)
     if span:
         region = t[span[0]:span[1]]
 
-    out = OrderedDict()
-
-    # 1) "key": "value"
-    for m in PAIR_STR_STR.finditer(region):
-        k, v = m.group(1), m.group(2)
-        out[_trim(k)] = maybe_zero_pad_dates(v, normalize_dates)
-
-    # 2) "key": bare
-    for m in PAIR_STR_BARE.finditer(region):
-        k = m.group(1)
-        mm = re.search(r':\s*([^\s,}\n\r]+)', m.group(0))
-        v = mm.group(1) if mm else ""
-        out[_trim(k)] = maybe_zero_pad_dates(v, normalize_dates)
+    out = {}
 
-    # 3) bare key: "value"
-    for m in PAIR_BARE_STR.finditer(region):
-        k, v = m.group(1), m.group(2)
-        out[_trim(k)] = maybe_zero_pad_dates(v, normalize_dates)
-
-    # 4) bare key: bare value
-    for m in PAIR_BARE_BARE.finditer(region):
-        k, v = m.group(1), m.group(2)
-        v = re.sub(r"[}\]]\s*$", "", v).strip()
-        out[_trim(k)] = maybe_zero_pad_dates(v, normalize_dates)
+    for kind, k, v in _iter_pairs(region):
+        if kind == "str_bare" or kind == "bare_bare":
+            v = TRAILING_BRACKET_RE.sub("", v)
+        out[_trim(k)] = _trim(v)
 
+    if normalize_dates:
+        _normalize_dates_bulk(out)
     return {
-        "all_key_values": dict(out),
+        "all_key_values": out,
         "selected_key_values": {},
     }
 
-def write_json_array(recs: List[dict], path: str):
+
+def split_batch_reply(llm_raw: str, names: List[str]) -> List[str]:
+    """Split a multi-image reply (see :func:`build_vlm_batch_messages`) into per-image raws.
+
+    Objects are matched by their ``image`` key, or by position when the reply
+    carries no ``image`` keys at all. Raises ``ValueError`` when the reply does
+    not hold exactly one object per image, or when its labels do not name each
+    requested file exactly once (including duplicate file names in one batch),
+    so callers fall back to one request per image rather than attaching a
+    result to the wrong image.
+    """
+    t = _preclean(llm_raw if isinstance(llm_raw, str) else str(llm_raw or ""))
+    try:
+        j: Any = _json_loads(t)
+    except Exception:
+        j = try_json_load(t)
+    if isinstance(j, dict):
+        items = next((v for k, v in j.items() if str(k).lower() == BATCH_RESULTS_KEY), None)
+        if items is None:
+            items = next((v for v in j.values() if isinstance(v, list)), None)
+        j = items
+    if not isinstance(j, list) or len(j) != len(names) or not all(isinstance(it, dict) for it in j):
+        raise ValueError(f"expected {len(names)} per-image objects in the batched reply")
+
+    items = [dict(it) for it in j]
+    labels = [it.pop("image", None) for it in items]
+    if any(label is not None for label in labels):
+        if len(set(names)) != len(names) or sorted(str(label) for label in labels) != sorted(names):
+            raise ValueError("batched reply labels do not match the requested images")
+        by_name = dict(zip(map(str, labels), items))
+        items = [by_name[n] for n in names]
+    return [json.dumps(it, ensure_ascii=False) for it in items]
+
+def merge_kv_replies(raws: List[str]) -> str:
+    """Merge several partial replies (e.g. image tiles) into one JSON reply.
+
+    Each reply goes through :func:`parse_universal_kv` without date
+    normalisation (the merged reply is parsed again downstream); the first
+    value seen for a key wins, so overlapping tiles do not overwrite the
+    strip that showed the field first.
+    """
+    all_kv: Dict[str, str] = {}
+    selected_kv: Dict[str, str] = {}
+    for raw in raws:
+        parsed = parse_universal_kv(raw, normalize_dates=False)
+        for k, v in parsed["all_key_values"].items():
+            all_kv.setdefault(k, v)
+        for k, v in parsed["selected_key_values"].items():
+            selected_kv.setdefault(k, v)
+    return json.dumps({"all_key_values": all_kv, "selected_key_values": selected_kv}, ensure_ascii=False)
+
+
+def _json_bytes(obj: Any, indent: bool = True) -> bytes:
+    """Encode ``obj`` as UTF-8 JSON (2-space indented, or compact), using orjson when available."""
+    if HAS_ORJSON:
+        try:
+            option = orjson.OPT_NON_STR_KEYS | (orjson.OPT_INDENT_2 if indent else 0)
+            return orjson.dumps(obj, option=option)
+        except TypeError:  # orjson.JSONEncodeError; let the stdlib encoder decide
+            pass
+    if indent:
+        return json.dumps(obj, ensure_ascii=False, indent=2).encode("utf-8")
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+def write_json_array(recs: List[dict], path: str) -> None:
     """Persist ``recs`` to ``path`` as UTF-8 encoded JSON."""
     safe_mkdir(Path(path).parent.as_posix())
-    with open(path, "w", encoding="utf-8") as f:
-        json.dump(recs, f, ensure_ascii=False, indent=2)
+    with open(path, "wb") as f:
+        f.write(_json_bytes(recs))
+
+class JsonArrayWriter:
+    """Stream records into ``path`` as a JSON array, one element at a time.
+
+    The output matches :func:`write_json_array` byte for byte, but only the
+    record being written is held in memory and every completed record is
+    flushed to disk immediately, so an interrupted folder run keeps its
+    progress.
+    """
+
+    def __init__(self, path: str):
+        safe_mkdir(Path(path).parent.as_posix())
+        self.path = path
+        self.count = 0
+        self._fh = open(path, "wb", buffering=1 << 16)
+        self._fh.write(b"[")
+
+    def write(self, rec: Union[OcrRecord, dict]) -> None:
+        body = _json_bytes(rec.to_dict() if isinstance(rec, OcrRecord) else rec)
+        # Escaped JSON never contains raw newlines, so re-indenting is safe.
+        self._fh.write((b"\n  " if self.count == 0 else b",\n  ") + body.replace(b"\n", b"\n  "))
+        self._fh.flush()
+        self.count += 1
+
+    def close(self) -> None:
+        if self._fh.closed:
+            return
+        self._fh.write(b"\n]" if self.count else b"]")
+        self._fh.close()
+
+    def __enter__(self) -> "JsonArrayWriter":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+class JsonLinesWriter(JsonArrayWriter):
+    """Stream records into ``path`` as JSON Lines, one compact object per line.
+
+    Unlike the array form, a file cut short by an interrupted run is still
+    valid line by line.
+    """
+
+    def __init__(self, path: str):
+        safe_mkdir(Path(path).parent.as_posix())
+        self.path = path
+        self.count = 0
+        self._fh = open(path, "wb", buffering=1 << 16)
+
+    def write(self, rec: Union[OcrRecord, dict]) -> None:
+        self._fh.write(_json_bytes(rec.to_dict() if isinstance(rec, OcrRecord) else rec, indent=False) + b"\n")
+        self._fh.flush()
+        self.count += 1
+
+    def close(self) -> None:
+        if not self._fh.closed:
+            self._fh.close()
+
+OUTPUT_WRITERS = {"json": ("structured.json", JsonArrayWriter), "jsonl": ("structured.jsonl", JsonLinesWriter)}
 
 # --------------------------
 # Pipeline
 # --------------------------
+@dataclass
+class OcrRecord:
+    """One structured.json entry: the image name, raw VLM reply and parsed pairs."""
+    __slots__ = ("image", "llm_raw", "llm_parsed")
+    image: str
+    llm_raw: str
+    llm_parsed: Dict[str, Dict[str, str]]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "image": self.image,
+            "llm_raw": self.llm_raw,
+            "llm_parsed": self.llm_parsed,
+        }
+
+def file_digest(path: str) -> str:
+    """Hex content hash of ``path`` (BLAKE3 when installed, else BLAKE2b), read in chunks."""
+    hasher: Any = blake3.blake3() if HAS_BLAKE3 else hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(1 << 20)
+            if not chunk:
+                break
+            hasher.update(chunk)
+    return hasher.hexdigest()[:32]
+
+class ResponseCache:
+    """Disk-backed memo of raw VLM replies shared across folder runs (``--cache``).
+
+    Entries are keyed by a hash of the image bytes together with the OCR hint
+    and a caller supplied ``namespace`` (mode, model, prompt, ...), so
+    duplicate images (re-shoots, copies in other folders) share one reply
+    while an edited image or a changed prompt never returns a stale one.
+    Raw replies are stored rather than parsed records, letting parser options
+    such as date normalisation change between runs.
+    """
+
+    def __init__(self, path: str, namespace: str = ""):
+        self.path = path
+        self.namespace = namespace
+        self._entries: Dict[str, str] = {}
+        self._dirty = False
+        self._lock = threading.Lock()
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = _json_loads(f.read())
+            if isinstance(data, dict):
+                self._entries = {k: v for k, v in data.items() if isinstance(v, str)}
+        except FileNotFoundError:
+            pass
+        except Exception:
+            print(f"[warn] Ignoring unreadable response cache {path}", file=sys.stderr)
+
+    def key(self, image_path: str, ocr_hint: Optional[str]) -> str:
+        material = "\0".join((self.namespace, file_digest(image_path), ocr_hint or ""))
+        return hashlib.blake2b(material.encode("utf-8"), digest_size=16).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        return self._entries.get(key)
+
+    def put(self, key: str, raw: str) -> None:
+        if not raw:
+            return
+        with self._lock:
+            self._entries[key] = raw
+            self._dirty = True
+
+    def save(self) -> None:
+        """Atomically persist the cache if anything changed."""
+        with self._lock:
+            if not self._dirty:
+                return
+            safe_mkdir(Path(self.path).parent.as_posix())
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(_json_bytes(self._entries, indent=False))
+            os.replace(tmp_path, self.path)
+            self._dirty = False
+
+def local_cache_namespace(
+    model_id: str,
+    dtype: str,
+    max_new_tokens: int,
+    system_prompt: Optional[str],
+    options: Dict[str, Any],
+) -> str:
+    """:class:`ResponseCache` namespace for local runs.
+
+    ``options`` holds the keyword options passed to
+    :func:`build_local_vlm_call` (quantisation, max_pixels, tiling, ...), so
+    changing any of them between runs misses the cache instead of replaying
+    replies generated under the old settings.
+    """
+    return json.dumps(["local", model_id, dtype, max_new_tokens, system_prompt or "", options], sort_keys=True)
+
 def process_one(
     vlm_call: Callable[[str, Optional[str]], str],
     image_path: str,
     normalize_dates: bool,
     ocr_hint: Optional[str] = None,
-) -> Dict[str, Any]:
-    """Run the VLM against ``image_path`` and return both raw and parsed output."""
-    raw = vlm_call(image_path, ocr_hint)
-    parsed = parse_universal_kv(raw, normalize_dates=normalize_dates)
-    return {
-        "image": Path(image_path).name,
-        "llm_raw": raw,
-        "llm_parsed": parsed,
-    }
+    cache: Optional[ResponseCache] = None,
+    strict_json: bool = False,
+) -> OcrRecord:
+    """Run the VLM against ``image_path`` and return both raw and parsed output.
+
+    When ``cache`` is supplied a previously stored reply for the same image
+    and prompt is reused instead of calling the model again.
+    """
+    cache_key = cache.key(image_path, ocr_hint) if cache is not None else None
+    raw = cache.get(cache_key) if cache is not None and cache_key else None
+    if raw is None:
+        raw = vlm_call(image_path, ocr_hint)
+        if cache is not None and cache_key:
+            cache.put(cache_key, raw)
+    return build_record(image_path, raw, normalize_dates, strict_json)
+
+def build_record(image_path: str, raw: str, normalize_dates: bool, strict_json: bool = False) -> OcrRecord:
+    """Assemble the structured.json entry for one raw VLM reply."""
+    parsed = parse_universal_kv(raw, normalize_dates=normalize_dates, strict_json=strict_json)
+    return OcrRecord(image=Path(image_path).name, llm_raw=raw, llm_parsed=parsed)
+
+def _process_chunk(
+    vlm_call: Callable[[str, Optional[str]], str],
+    paths: List[Path],
+    normalize_dates: bool,
+    ocr_hint: Optional[str],
+    cache: Optional[ResponseCache],
+    strict_json: bool = False,
+) -> List[OcrRecord]:
+    """Process ``paths`` with a single batched VLM call when one is available.
+
+    Cached replies are served directly; the remaining images go through
+    ``vlm_call.batch``. If the batch fails (e.g. out of memory) the chunk
+    falls back to one call per image.
+    """
+    batch_call = getattr(vlm_call, "batch", None)
+    raws: List[Optional[str]] = []
+    keys: List[Optional[str]] = []
+    for p in paths:
+        key = cache.key(str(p), ocr_hint) if cache is not None else None
+        keys.append(key)
+        raws.append(cache.get(key) if cache is not None and key else None)
+
+    pending = [i for i, raw in enumerate(raws) if raw is None]
+    if pending and batch_call is not None and len(pending) > 1:
+        try:
+            outputs = batch_call([str(paths[i]) for i in pending], ocr_hint)
+        except Exception as exc:
+            print(f"[warn] Batched inference failed ({exc}); retrying one image at a time", file=sys.stderr)
+        else:
+            for i, raw in zip(pending, outputs):
+                raws[i] = raw
+            pending = []
+
+    for i in pending:
+        raws[i] = vlm_call(str(paths[i]), ocr_hint)
+
+    records: List[OcrRecord] = []
+    for p, key, raw in zip(paths, keys, raws):
+        raw = raw or ""
+        if cache is not None and key:
+            cache.put(key, raw)
+        records.append(build_record(str(p), raw, normalize_dates, strict_json))
+    return records
+
+def _sorted_entries(path: str) -> Iterator[os.DirEntry]:
+    try:
+        with os.scandir(path) as it:
+            entries = sorted(it, key=lambda e: os.path.normcase(e.name))
+    except OSError:
+        return iter(())
+    return iter(entries)
+
+def _iter_images(root: str) -> Iterator[Path]:
+    """Lazily yield image files under ``root`` in ``sorted(Path.rglob(...))`` order.
+
+    Only one directory listing per level is held at a time: walking each
+    directory's entries in name order depth-first gives the same order as
+    sorting the full paths part by part. Like ``Path.rglob`` this does not
+    descend into symlinked directories.
+    """
+    stack = [_sorted_entries(root)]
+    while stack:
+        entry = next(stack[-1], None)
+        if entry is None:
+            stack.pop()
+            continue
+        try:
+            if entry.is_dir(follow_symlinks=False):
+                stack.append(_sorted_entries(entry.path))
+                continue
+        except OSError:
+            continue
+        name = entry.name
+        dot = name.rfind(".")
+        if dot > 0 and name[dot:].lower() in IMAGE_EXTS:
+            yield Path(entry.path)
+
+def _with_prefetch(chunks: Iterator[List[Path]], prefetch: Callable[[List[str]], None]) -> Iterator[List[Path]]:
+    """Yield ``chunks`` unchanged, handing each one to ``prefetch`` a step ahead."""
+    current = next(chunks, None)
+    while current is not None:
+        upcoming = next(chunks, None)
+        if upcoming is not None:
+            prefetch([str(p) for p in upcoming])
+        yield current
+        current = upcoming
 
 def process_folder(
     vlm_call: Callable[[str, Optional[str]], str],
@@ -1092,43 +2210,123 @@ def process_folder(
     out_dir: str,
     normalize_dates: bool,
     ocr_hint: Optional[str] = None,
+    cache: Optional[ResponseCache] = None,
+    batch_size: int = 1,
+    max_workers: int = 1,
+    strict_json: bool = False,
+    output_format: str = "json",
 ):
-    """Process every image in ``data_dir`` and persist a structured summary."""
-    structured_json = str(Path(out_dir)/"structured.json")
-    structured: List[dict] = []
+    """Process every image in ``data_dir`` and persist a structured summary.
+
+    With ``batch_size > 1`` and a VLM callable exposing ``.batch`` (local
+    batching, or remote multi-image requests), images are grouped so each
+    call covers several of them. ``max_workers > 1`` issues that many VLM
+    calls (single images or groups) concurrently; records are still written
+    in path order. ``output_format="jsonl"`` writes ``structured.jsonl``
+    (one record per line) instead of the ``structured.json`` array.
+    """
+    out_name, writer_cls = OUTPUT_WRITERS[output_format]
+    structured_json = str(Path(out_dir)/out_name)
 
-    paths = sorted([p for p in Path(data_dir).rglob("*") if p.suffix.lower() in IMAGE_EXTS])
-    if not paths:
+    paths = _iter_images(data_dir)
+    first = next(paths, None)
+    if first is None:
         print(f"[warn] No images under {data_dir}")
+    else:
+        paths = chain((first,), paths)
 
-    for p in paths:
+    step = max(1, int(batch_size or 1)) if hasattr(vlm_call, "batch") else 1
+    workers = max(1, int(max_workers or 1))
+
+    def run(p: Path) -> OcrRecord:
         print(f"[proc] {p.name}")
-        rec = process_one(
+        return process_one(
             vlm_call,
             str(p),
             normalize_dates=normalize_dates,
             ocr_hint=ocr_hint,
+            cache=cache,
+            strict_json=strict_json,
         )
-        structured.append(rec)
 
-    write_json_array(structured, structured_json)
+    def run_chunk(chunk: List[Path]) -> List[OcrRecord]:
+        if len(chunk) == 1:
+            return [run(chunk[0])]
+        print(f"[proc] {', '.join(p.name for p in chunk)}")
+        return _process_chunk(vlm_call, chunk, normalize_dates, ocr_hint, cache, strict_json)
+
+    chunks = iter(lambda: list(islice(paths, step)), [])
+
+    try:
+        with writer_cls(structured_json) as writer:
+            if workers > 1:
+                pool = ThreadPoolExecutor(max_workers=workers)
+                # Keep a bounded window of requests in flight and drain it in
+                # submission order, so output stays sorted without queueing
+                # the whole directory up front.
+                pending: deque = deque()
+                try:
+                    for chunk in chunks:
+                        pending.append(pool.submit(run_chunk, chunk))
+                        if len(pending) >= 2 * workers:
+                            for rec in pending.popleft().result():
+                                writer.write(rec)
+                    while pending:
+                        for rec in pending.popleft().result():
+                            writer.write(rec)
+                except BaseException:
+                    pool.shutdown(wait=True, cancel_futures=True)
+                    raise
+                pool.shutdown(wait=True)
+            else:
+                prefetch = getattr(vlm_call, "prefetch", None)
+                if prefetch is not None:
+                    chunks = _with_prefetch(chunks, prefetch)
+                for chunk in chunks:
+                    for rec in run_chunk(chunk):
+                        writer.write(rec)
+    finally:
+        if cache is not None:
+            cache.save()
+
     print(f"[done] Array JSON -> {structured_json}")
 
 # --------------------------
-# Main
+# Runtime configuration
 # --------------------------
-def main():
-    ap = argparse.ArgumentParser()
-    ap.add_argument("--image", help="Single image path")
-    ap.add_argument("--data_dir", help="Folder of images (recursive)")
-    ap.add_argument("--out_dir", default="./output")
-    ap.add_argument("--hf_token", default=None, help="HF token (else env HF_TOKEN)")
-    ap.add_argument("--provider", default="", help="Inference provider id (HF router provider name)")
-    ap.add_argument("--model", default=DEFAULT_MODEL, help="Model id or deployment (provider-specific)")
-    ap.add_argument("--mode", choices=["remote", "local"], default=None, help="Force execution mode (defaults to VLM_MODE)")
-    ap.add_argument("--check_model", action="store_true", help="Only verify the local model cache and exit")
-    ap.add_argument("--no_normalize_dates", action="store_true", help="Disable date zero-padding normalization")
-    args = ap.parse_args()
+RUNTIME_ENV_KEYS = ("VLM_REMOTE_CONFIG", "HF_TOKEN", "OCR_HINT_TEXT", "OCR_SYSTEM_PROMPT", "VLM_MODE")
+
+@dataclass(frozen=True)
+class RuntimeConfig:
+    """Provider, credential and prompt settings resolved from VLM_REMOTE_CONFIG and env."""
+    remote_cfg: Dict[str, Any]
+    provider_type: str
+    token: Optional[str]
+    model: str
+    defaults: Dict[str, Any]
+    ocr_hint: Optional[str]
+    system_prompt: Optional[str]
+    mode: str
+    proxy_url: Optional[str] = None
+    timeout_s: Optional[float] = None
+
+def resolve_runtime_config(hf_token: Optional[str], model: str, mode: Optional[str]) -> RuntimeConfig:
+    """Resolve the runtime configuration, reusing the previous result while inputs are unchanged.
+
+    The relevant environment variables are part of the cache key, so a
+    long-lived worker that edits them still sees fresh settings.
+    """
+    env_snapshot = tuple(os.environ.get(k) for k in RUNTIME_ENV_KEYS)
+    return _resolve_runtime_config(hf_token, model, mode, env_snapshot)
+
+@lru_cache(maxsize=4)
+def _resolve_runtime_config(
+    hf_token: Optional[str],
+    model: str,
+    mode: Optional[str],
+    env_snapshot: Tuple[Optional[str], ...],
+) -> RuntimeConfig:
+    env = dict(zip(RUNTIME_ENV_KEYS, env_snapshot))
 
     remote_cfg = load_remote_config()
     remote_cfg = remote_cfg if isinstance(remote_cfg, dict) else {}
@@ -1140,7 +2338,7 @@ def main():
         provider_type = "huggingface"
     remote_cfg["providerType"] = provider_type
 
-    token = args.hf_token or os.environ.get("HF_TOKEN")
+    token = hf_token or env["HF_TOKEN"]
 
     defaults = remote_cfg.get("defaults") if isinstance(remote_cfg.get("defaults"), dict) else {}
     ocr_hint: Optional[str] = None
@@ -1149,14 +2347,16 @@ def main():
         hint_candidate = ocr_cfg.get("prefillTranscript") or ocr_cfg.get("ocrHint")
         if isinstance(hint_candidate, str) and hint_candidate.strip():
             ocr_hint = hint_candidate.strip()
-    env_hint = os.environ.get("OCR_HINT_TEXT")
+    env_hint = env["OCR_HINT_TEXT"]
     if isinstance(env_hint, str) and env_hint.strip():
         ocr_hint = env_hint.strip()
 
+    proxy_url: Optional[str] = None
+    timeout_s: Optional[float] = None
     if remote_cfg:
         model_override = remote_cfg.get("modelId")
         if isinstance(model_override, str) and model_override.strip():
-            args.model = model_override.strip()
+            model = model_override.strip()
 
         api_key = remote_cfg.get("apiKey")
         auth_scheme = str(remote_cfg.get("authScheme") or "").lower()
@@ -1169,30 +2369,111 @@ def main():
             ):
                 token = api_key
 
-        proxy_url = remote_cfg.get("proxyUrl")
-        if isinstance(proxy_url, str) and proxy_url.strip():
-            os.environ.setdefault("HTTPS_PROXY", proxy_url.strip())
-            os.environ.setdefault("HTTP_PROXY", proxy_url.strip())
+        proxy_candidate = remote_cfg.get("proxyUrl")
+        if isinstance(proxy_candidate, str) and proxy_candidate.strip():
+            proxy_url = proxy_candidate.strip()
 
         timeout_override = remote_cfg.get("requestTimeoutMs")
         if isinstance(timeout_override, (int, float)) and timeout_override > 0:
-            os.environ["HF_TIMEOUT"] = str(float(timeout_override) / 1000.0)
+            timeout_s = float(timeout_override) / 1000.0
 
+    # A prompt from the remote config wins over OCR_SYSTEM_PROMPT
     system_prompt = defaults.get("systemPrompt") if isinstance(defaults.get("systemPrompt"), str) else None
-    if isinstance(system_prompt, str):
-        os.environ["OCR_SYSTEM_PROMPT"] = system_prompt
-
-    env_system_prompt = os.environ.get("OCR_SYSTEM_PROMPT")
-    if isinstance(env_system_prompt, str):
-        system_prompt = env_system_prompt
+    if system_prompt is None:
+        system_prompt = env["OCR_SYSTEM_PROMPT"]
 
-    cli_mode = (args.mode or "").strip().lower()
-    env_mode = (os.environ.get("VLM_MODE") or "").strip().lower()
-    mode = "remote"
+    cli_mode = (mode or "").strip().lower()
+    env_mode = (env["VLM_MODE"] or "").strip().lower()
+    resolved_mode = "remote"
     if cli_mode in {"local", "remote"}:
-        mode = cli_mode
+        resolved_mode = cli_mode
     if env_mode in {"local", "remote"}:
-        mode = env_mode
+        resolved_mode = env_mode
+
+    return RuntimeConfig(
+        remote_cfg=remote_cfg,
+        provider_type=provider_type,
+        token=token,
+        model=model,
+        defaults=defaults,
+        ocr_hint=ocr_hint,
+        system_prompt=system_prompt,
+        mode=resolved_mode,
+        proxy_url=proxy_url,
+        timeout_s=timeout_s,
+    )
+
+def apply_runtime_environment(runtime: RuntimeConfig) -> None:
+    """Export the proxy, timeout and prompt settings that downstream SDKs read from env."""
+    if runtime.proxy_url:
+        os.environ.setdefault("HTTPS_PROXY", runtime.proxy_url)
+        os.environ.setdefault("HTTP_PROXY", runtime.proxy_url)
+    if runtime.timeout_s is not None:
+        os.environ["HF_TIMEOUT"] = str(runtime.timeout_s)
+    if isinstance(runtime.system_prompt, str):
+        os.environ["OCR_SYSTEM_PROMPT"] = runtime.system_prompt
+
+# --------------------------
+# Main
+# --------------------------
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--image", help="Single image path")
+    ap.add_argument("--data_dir", help="Folder of images (recursive)")
+    ap.add_argument("--out_dir", default="./output")
+    ap.add_argument("--hf_token", default=None, help="HF token (else env HF_TOKEN)")
+    ap.add_argument("--provider", default="", help="Inference provider id (HF router provider name)")
+    ap.add_argument("--model", default=DEFAULT_MODEL, help="Model id or deployment (provider-specific)")
+    ap.add_argument("--mode", choices=["remote", "local"], default=None, help="Force execution mode (defaults to VLM_MODE)")
+    ap.add_argument("--check_model", action="store_true", help="Only verify the local model cache and exit")
+    ap.add_argument("--no_normalize_dates", action="store_true", help="Disable date zero-padding normalization")
+    ap.add_argument(
+        "--cache",
+        action="store_true",
+        help="Reuse VLM replies saved in <out_dir>/.vlm_cache.json by earlier --data_dir runs (off by default)",
+    )
+    ap.add_argument(
+        "--batch_size",
+        type=int,
+        default=None,
+        help=(
+            "Images per forward pass (local, default OCR_LOCAL_BATCH_SIZE) or per multi-image request "
+            "(remote with capabilities.batching, default OCR_REMOTE_BATCH_SIZE) for --data_dir runs"
+        ),
+    )
+    ap.add_argument(
+        "--max_workers",
+        type=int,
+        default=env_int("OCR_MAX_WORKERS", 1),
+        help="Concurrent remote VLM requests for --data_dir runs; the first failed request stops the run",
+    )
+    ap.add_argument(
+        "--quant",
+        choices=LOCAL_QUANT_MODES,
+        default=(os.environ.get("OCR_LOCAL_QUANT") or "none").strip().lower(),
+        help="Weight quantization for the local model (CUDA; int8/int4 need bitsandbytes, fp8 an sm_89+ GPU)",
+    )
+    ap.add_argument(
+        "--output_format",
+        choices=sorted(OUTPUT_WRITERS),
+        default="json",
+        help="--data_dir output: structured.json array (default) or structured.jsonl lines",
+    )
+    args = ap.parse_args()
+
+    runtime = resolve_runtime_config(args.hf_token, args.model, args.mode)
+    apply_runtime_environment(runtime)
+
+    remote_cfg = dict(runtime.remote_cfg)
+    provider_type = runtime.provider_type
+    token = runtime.token
+    defaults = runtime.defaults
+    ocr_hint = runtime.ocr_hint
+    system_prompt = runtime.system_prompt
+    mode = runtime.mode
+    args.model = runtime.model
+    if args.batch_size is None:
+        args.batch_size = env_int("OCR_LOCAL_BATCH_SIZE" if mode == "local" else "OCR_REMOTE_BATCH_SIZE", 1)
 
     if args.check_model and mode != "local":
         sys.exit("[FATAL] Local model availability checks require mode=local")
@@ -1206,11 +2487,10 @@ def main():
         flash_flag = os.environ.get("OCR_LOCAL_FLASH_ATTENTION")
         if parse_bool(flash_flag, False) and not attn_impl_env:
             attn_impl_env = "flash_attention_2"
-        max_tokens_env = os.environ.get("OCR_LOCAL_MAX_NEW_TOKENS")
-        try:
-            max_tokens = int(max_tokens_env) if max_tokens_env not in {None, ""} else DEFAULT_LOCAL_MAX_NEW_TOKENS
-        except Exception:
-            max_tokens = DEFAULT_LOCAL_MAX_NEW_TOKENS
+        max_tokens = env_int("OCR_LOCAL_MAX_NEW_TOKENS", DEFAULT_LOCAL_MAX_NEW_TOKENS)
+        max_pixels = env_int("OCR_LOCAL_MAX_PIXELS", 0) or None
+        tile_rows = env_int("OCR_LOCAL_TILE_ROWS", 1)
+        tile_overlap = env_int("OCR_LOCAL_TILE_OVERLAP", 64)
 
         if args.check_model:
             try:
@@ -1226,8 +2506,26 @@ def main():
         except RuntimeError as exc:
             sys.exit(f"[FATAL] {exc}")
 
+        # Every option that can change a reply; also keys the response cache
+        local_options: Dict[str, Any] = {
+            "quant": args.quant,
+            "json_stop": parse_bool(os.environ.get("OCR_LOCAL_JSON_STOP"), True),
+            "compile_model": parse_bool(os.environ.get("OCR_LOCAL_TORCH_COMPILE"), False),
+            "max_pixels": max_pixels,
+            "gpu_decode": parse_bool(os.environ.get("OCR_LOCAL_GPU_DECODE"), False),
+            "tile_rows": tile_rows,
+            "tile_overlap": tile_overlap,
+        }
         try:
-            vlm_call = build_local_vlm_call(local_model, dtype, device_map, max_tokens, attn_impl_env, system_prompt)
+            vlm_call = build_local_vlm_call(
+                local_model,
+                dtype,
+                device_map,
+                max_tokens,
+                attn_impl_env,
+                system_prompt,
+                **local_options,
+            )
         except RuntimeError as exc:
             sys.exit(f"[FATAL] {exc}")
 
@@ -1242,14 +2540,27 @@ def main():
                 sys.exit(f"[FATAL] Image not found: {p}")
             print(f"[proc] {p.name}")
             rec = process_one(vlm_call, str(p), normalize_dates=normalize_dates, ocr_hint=ocr_hint)
-            write_json_array([rec], str(Path(args.out_dir) / "structured.json"))
-            print(json.dumps(rec, ensure_ascii=False, indent=2))
+            write_json_array([rec.to_dict()], str(Path(args.out_dir) / "structured.json"))
+            print(_json_bytes(rec.to_dict()).decode("utf-8"))
             return
 
         if args.data_dir:
             if not Path(args.data_dir).exists():
                 sys.exit(f"[FATAL] Folder not found: {args.data_dir}")
-            process_folder(vlm_call, args.data_dir, args.out_dir, normalize_dates, ocr_hint)
+            cache = None
+            if args.cache:
+                namespace = local_cache_namespace(local_model, dtype, max_tokens, system_prompt, local_options)
+                cache = ResponseCache(str(Path(args.out_dir) / ".vlm_cache.json"), namespace)
+            process_folder(
+                vlm_call,
+                args.data_dir,
+                args.out_dir,
+                normalize_dates,
+                ocr_hint,
+                cache=cache,
+                batch_size=args.batch_size,
+                output_format=args.output_format,
+            )
             return
 
         print("Provide --image or --data_dir")
@@ -1291,23 +2602,75 @@ def main():
             messages = build_vlm_messages(image_path, ocr_txt, system_prompt)
             return call_http_vlm(remote_cfg, base_url, args.model, messages, defaults)
 
+    # Opt-in multi-image requests: one call per --batch_size images for providers
+    # flagged with capabilities.batching.
+    capabilities = remote_cfg.get("capabilities") if isinstance(remote_cfg.get("capabilities"), dict) else {}
+    if (
+        args.data_dir
+        and args.batch_size > 1
+        and parse_bool(capabilities.get("batching"), False)
+    ):
+        batch_base = request_base if provider_type == "huggingface" else base_url
+
+        def vlm_batch(image_paths: List[str], ocr_txt: Optional[str]) -> List[str]:
+            messages = build_vlm_batch_messages(image_paths, ocr_txt, system_prompt)
+            raw = call_http_vlm(remote_cfg, batch_base, args.model, messages, defaults)
+            return split_batch_reply(raw, [os.path.basename(p) for p in image_paths])
+
+        vlm_call.batch = vlm_batch  # type: ignore[attr-defined]
+
     safe_mkdir(args.out_dir)
     normalize_dates = not args.no_normalize_dates
+    # JSON mode guarantees an object, so the regex fallback cannot help
+    strict_json = bool(defaults.get("jsonMode"))
 
     if args.image:
         p = Path(args.image)
         if not p.exists():
             sys.exit(f"[FATAL] Image not found: {p}")
         print(f"[proc] {p.name}")
-        rec = process_one(vlm_call, str(p), normalize_dates=normalize_dates, ocr_hint=ocr_hint)
-        write_json_array([rec], str(Path(args.out_dir) / "structured.json"))
-        print(json.dumps(rec, ensure_ascii=False, indent=2))
+        rec = process_one(
+            vlm_call,
+            str(p),
+            normalize_dates=normalize_dates,
+            ocr_hint=ocr_hint,
+            strict_json=strict_json,
+        )
+        write_json_array([rec.to_dict()], str(Path(args.out_dir) / "structured.json"))
+        print(_json_bytes(rec.to_dict()).decode("utf-8"))
         return
 
     if args.data_dir:
         if not Path(args.data_dir).exists():
             sys.exit(f"[FATAL] Folder not found: {args.data_dir}")
-        process_folder(vlm_call, args.data_dir, args.out_dir, normalize_dates, ocr_hint)
+        cache = None
+        if args.cache:
+            namespace = json.dumps(
+                [
+                    "remote",
+                    provider_type,
+                    remote_cfg.get("hfProvider") or "",
+                    remote_cfg.get("baseUrl") or "",
+                    args.model,
+                    system_prompt or "",
+                    defaults,
+                ],
+                sort_keys=True,
+                default=str,
+            )
+            cache = ResponseCache(str(Path(args.out_dir) / ".vlm_cache.json"), namespace)
+        process_folder(
+            vlm_call,
+            args.data_dir,
+            args.out_dir,
+            normalize_dates,
+            ocr_hint,
+            cache=cache,
+            batch_size=args.batch_size,
+            max_workers=args.max_workers,
+            strict_json=strict_json,
+            output_format=args.output_format,
+        )
         return
 
     print("Provide --image or --data_dir")
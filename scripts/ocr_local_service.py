@@ -3,17 +3,19 @@
 from __future__ import annotations
 
 import argparse
-import json
 import os
+import queue
 import signal
 import sys
 import threading
 import time
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+from contextlib import contextmanager
 from dataclasses import dataclass
 from http import HTTPStatus
 from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from pathlib import Path
-from typing import Any, Dict, Optional
+from typing import Any, Dict, Iterator, List, Optional, Tuple
 
 SCRIPT_DIR = Path(__file__).resolve().parent
 if str(SCRIPT_DIR) not in sys.path:
@@ -22,8 +24,13 @@ if str(SCRIPT_DIR) not in sys.path:
 from ocr_extract import (  # noqa: E402
     DEFAULT_LOCAL_MAX_NEW_TOKENS,
     DEFAULT_MODEL,
+    LOCAL_QUANT_MODES,
+    _json_bytes,
+    _json_loads,
     build_local_vlm_call,
+    build_record,
     ensure_local_model_available,
+    env_int,
     parse_bool,
     process_one,
 )
@@ -43,6 +50,10 @@ except Exception:
         pass
 
 
+# How often a caller waiting on the request batcher checks that it is still alive
+BATCHER_POLL_S = 5.0
+
+
 @dataclass
 class ServiceConfig:
     """Declarative configuration for the long-lived inference server."""
@@ -53,6 +64,16 @@ class ServiceConfig:
     attn_impl: Optional[str]
     system_prompt: Optional[str]
     normalize_dates: bool
+    quant: Optional[str] = None
+    json_stop: bool = True
+    compile_model: bool = False
+    max_pixels: Optional[int] = None
+    gpu_decode: bool = False
+    tile_rows: int = 1
+    tile_overlap: int = 64
+    max_batch: int = 1
+    batch_wait_ms: int = 10
+    max_concurrent: int = 1
 
 
 class ServiceContext:
@@ -68,20 +89,139 @@ class ServiceContext:
             config.max_new_tokens,
             config.attn_impl,
             config.system_prompt,
+            quant=config.quant,
+            json_stop=config.json_stop,
+            compile_model=config.compile_model,
+            max_pixels=config.max_pixels,
+            gpu_decode=config.gpu_decode,
+            tile_rows=config.tile_rows,
+            tile_overlap=config.tile_overlap,
         )
-        self.lock = threading.Lock()
+        # One slot per in-flight request, each on its own CUDA stream. The model
+        # closure runs generate() one call at a time, so slots only overlap
+        # image decoding, preprocessing and uploads with another's generation.
+        slots = max(1, config.max_concurrent)
+        self.lock = threading.BoundedSemaphore(slots)
+        self._streams: "queue.Queue[Any]" = queue.Queue()
+        if slots > 1 and cuda_available():
+            import torch  # type: ignore
+
+            for _ in range(slots):
+                self._streams.put(torch.cuda.Stream())
         self.started_at = time.time()
+        self._queue: "queue.Queue[Tuple[str, bool, Optional[str], Future]]" = queue.Queue()
+        self._batcher_thread: Optional[threading.Thread] = None
+        self._batcher_lock = threading.Lock()
+        if config.max_batch > 1 and getattr(self.vlm_call, "batch", None) is not None:
+            self._ensure_batcher()
 
     def infer(self, image_path: str, normalize_dates: Optional[bool], ocr_hint: Optional[str]) -> Dict[str, Any]:
-        """Perform a single inference while serialising access to the VLM."""
+        """Perform a single inference while serialising access to the VLM.
+
+        With ``max_batch > 1`` the request is queued instead, and requests
+        that arrive within ``batch_wait_ms`` of each other share one batched
+        ``generate`` call.
+        """
         target_normalize = self.config.normalize_dates if normalize_dates is None else bool(normalize_dates)
-        with self.lock:
-            return process_one(
+        if self._batcher_thread is not None:
+            future: Future = Future()
+            self._queue.put((image_path, target_normalize, ocr_hint, future))
+            while True:
+                try:
+                    return future.result(timeout=BATCHER_POLL_S)
+                except FutureTimeout:
+                    # Still queued or running; make sure a batcher is alive to serve it
+                    self._ensure_batcher()
+        with self.lock, self._inference_stream():
+            record = process_one(
                 self.vlm_call,
                 image_path,
                 normalize_dates=target_normalize,
                 ocr_hint=ocr_hint,
             )
+        return record.to_dict()
+
+    @contextmanager
+    def _inference_stream(self) -> Iterator[None]:
+        """Run the body on a pooled CUDA stream (a no-op without one)."""
+        if self._streams.empty():
+            yield
+            return
+        import torch  # type: ignore
+
+        stream = self._streams.get()
+        try:
+            with torch.cuda.stream(stream):
+                yield
+            stream.synchronize()
+        finally:
+            self._streams.put(stream)
+
+    def _ensure_batcher(self) -> None:
+        """Start the batcher thread, or restart it if it died."""
+        with self._batcher_lock:
+            if self._batcher_thread is not None and self._batcher_thread.is_alive():
+                return
+            if self._batcher_thread is not None:
+                sys.stderr.write("[warn] Request batcher stopped; restarting it\n")
+            self._batcher_thread = threading.Thread(target=self._run_batcher, name="vlm-batcher", daemon=True)
+            self._batcher_thread.start()
+
+    def _run_batcher(self) -> None:
+        """Drain queued requests into batched VLM calls until the process exits."""
+        wait_s = max(0, self.config.batch_wait_ms) / 1000.0
+        while True:
+            pending = [self._queue.get()]
+            try:
+                self._serve_batch(pending, wait_s)
+            except BaseException as exc:
+                # Never leave a caller waiting on a request this thread took
+                error = exc if isinstance(exc, Exception) else RuntimeError("Request batcher stopped")
+                for item in pending:
+                    if not item[3].done():
+                        item[3].set_exception(error)
+                if not isinstance(exc, Exception):
+                    raise
+
+    def _serve_batch(self, pending: List[Tuple[str, bool, Optional[str], Future]], wait_s: float) -> None:
+        """Top ``pending`` up for ``wait_s`` seconds, then run it grouped by OCR hint."""
+        deadline = time.monotonic() + wait_s
+        while len(pending) < self.config.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                pending.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        # One prompt is rendered per batch, so only requests sharing a hint are stacked
+        groups: Dict[Optional[str], List[Tuple[str, bool, Optional[str], Future]]] = {}
+        for item in pending:
+            groups.setdefault(item[2], []).append(item)
+        for ocr_hint, items in groups.items():
+            try:
+                with self.lock, self._inference_stream():
+                    self._infer_group(items, ocr_hint)
+            except Exception as exc:  # e.g. a CUDA error from the stream itself
+                sys.stderr.write(f"[warn] Batched inference failed: {exc}\n")
+                for item in items:
+                    if not item[3].done():
+                        item[3].set_exception(exc)
+
+    def _infer_group(self, items: List[Tuple[str, bool, Optional[str], Future]], ocr_hint: Optional[str]) -> None:
+        raws: List[Optional[str]] = [None] * len(items)
+        if len(items) > 1:
+            try:
+                raws = list(self.vlm_call.batch([item[0] for item in items], ocr_hint))  # type: ignore[attr-defined]
+            except Exception as exc:
+                sys.stderr.write(f"[warn] Batched inference failed ({exc}); retrying one request at a time\n")
+        for (image_path, normalize_dates, _hint, future), raw in zip(items, raws):
+            try:
+                if raw is None:
+                    raw = self.vlm_call(image_path, ocr_hint)
+                future.set_result(build_record(image_path, raw or "", normalize_dates).to_dict())
+            except Exception as exc:
+                future.set_exception(exc)
 
 
 SERVICE_CONTEXT: Optional[ServiceContext] = None
@@ -99,7 +239,7 @@ class LocalVlmHandler(BaseHTTPRequestHandler):
 
     def _send_json(self, status: HTTPStatus, payload: Dict[str, Any]) -> None:
         """Write a JSON response to the client with minimal caching headers."""
-        body = json.dumps(payload).encode("utf-8")
+        body = _json_bytes(payload, indent=False)
         self.send_response(status)
         self.send_header("Content-Type", "application/json")
         self.send_header("Cache-Control", "no-store")
@@ -155,7 +295,7 @@ class LocalVlmHandler(BaseHTTPRequestHandler):
             length = 0
         raw = self.rfile.read(max(length, 0)) if length else b""
         try:
-            payload = json.loads(raw.decode("utf-8") or "{}")
+            payload = _json_loads(raw.decode("utf-8") or "{}")
         except Exception:
             self._send_json(HTTPStatus.BAD_REQUEST, {"ok": False, "message": "Request body must be JSON"})
             return
@@ -196,7 +336,7 @@ def parse_args() -> argparse.Namespace:
     ap.add_argument(
         "--port",
         type=int,
-        default=int(os.environ.get("OCR_LOCAL_SERVICE_PORT", "5117")),
+        default=env_int("OCR_LOCAL_SERVICE_PORT", 5117),
     )
     ap.add_argument("--model", default=DEFAULT_MODEL)
     ap.add_argument("--dtype", default=os.environ.get("OCR_LOCAL_DTYPE", "auto"))
@@ -205,12 +345,48 @@ def parse_args() -> argparse.Namespace:
         "--max-new-tokens",
         dest="max_new_tokens",
         type=int,
-        default=int(os.environ.get("OCR_LOCAL_MAX_NEW_TOKENS", DEFAULT_LOCAL_MAX_NEW_TOKENS)),
+        default=env_int("OCR_LOCAL_MAX_NEW_TOKENS", DEFAULT_LOCAL_MAX_NEW_TOKENS),
     )
     ap.add_argument("--attn-impl", dest="attn_impl", default=os.environ.get("OCR_LOCAL_ATTN_IMPLEMENTATION") or "")
     ap.add_argument("--system-prompt", dest="system_prompt", default=os.environ.get("OCR_SYSTEM_PROMPT", ""))
     ap.add_argument("--no-normalize-dates", dest="no_normalize_dates", action="store_true")
     ap.add_argument("--flash-attn", dest="flash_attn", action="store_true")
+    ap.add_argument(
+        "--max-pixels",
+        dest="max_pixels",
+        type=int,
+        default=env_int("OCR_LOCAL_MAX_PIXELS", 0),
+    )
+    ap.add_argument("--tile-rows", dest="tile_rows", type=int, default=env_int("OCR_LOCAL_TILE_ROWS", 1))
+    ap.add_argument(
+        "--tile-overlap",
+        dest="tile_overlap",
+        type=int,
+        default=env_int("OCR_LOCAL_TILE_OVERLAP", 64),
+    )
+    ap.add_argument(
+        "--quant",
+        choices=LOCAL_QUANT_MODES,
+        default=(os.environ.get("OCR_LOCAL_QUANT") or "none").strip().lower(),
+    )
+    ap.add_argument(
+        "--max-batch",
+        dest="max_batch",
+        type=int,
+        default=env_int("OCR_LOCAL_SERVICE_MAX_BATCH", 1),
+    )
+    ap.add_argument(
+        "--max-concurrent",
+        dest="max_concurrent",
+        type=int,
+        default=env_int("OCR_LOCAL_SERVICE_MAX_CONCURRENT", 1),
+    )
+    ap.add_argument(
+        "--batch-wait-ms",
+        dest="batch_wait_ms",
+        type=int,
+        default=env_int("OCR_LOCAL_SERVICE_BATCH_WAIT_MS", 10),
+    )
     return ap.parse_args()
 
 
@@ -228,6 +404,16 @@ def resolve_attn_impl(arg_value: str, flash_flag: bool) -> Optional[str]:
     return None
 
 
+def cuda_available() -> bool:
+    """Return True when torch is importable and sees a CUDA device."""
+    try:
+        import torch  # type: ignore
+
+        return bool(torch.cuda.is_available())
+    except Exception:
+        return False
+
+
 def build_config(args: argparse.Namespace) -> ServiceConfig:
     """Normalise parsed arguments into a :class:`ServiceConfig`."""
     model_id = (args.model or "").strip() or DEFAULT_MODEL
@@ -237,6 +423,10 @@ def build_config(args: argparse.Namespace) -> ServiceConfig:
     attn_impl = resolve_attn_impl(args.attn_impl, bool(args.flash_attn))
     system_prompt = (args.system_prompt or "").strip() or None
     normalize_dates = not bool(args.no_normalize_dates)
+    compile_model = parse_bool(os.environ.get("OCR_LOCAL_TORCH_COMPILE"), False)
+    if compile_model and args.max_concurrent > 1:
+        sys.stderr.write("[warn] OCR_LOCAL_TORCH_COMPILE ignored: compiled CUDA graphs cannot run concurrently.\n")
+        compile_model = False
     return ServiceConfig(
         model_id=model_id,
         dtype=dtype,
@@ -245,6 +435,16 @@ def build_config(args: argparse.Namespace) -> ServiceConfig:
         attn_impl=attn_impl,
         system_prompt=system_prompt,
         normalize_dates=normalize_dates,
+        quant=args.quant,
+        json_stop=parse_bool(os.environ.get("OCR_LOCAL_JSON_STOP"), True),
+        compile_model=compile_model,
+        max_pixels=args.max_pixels or None,
+        gpu_decode=parse_bool(os.environ.get("OCR_LOCAL_GPU_DECODE"), False),
+        tile_rows=max(1, args.tile_rows),
+        tile_overlap=max(0, args.tile_overlap),
+        max_batch=max(1, args.max_batch),
+        batch_wait_ms=max(0, args.batch_wait_ms),
+        max_concurrent=max(1, args.max_concurrent),
     )
 
 
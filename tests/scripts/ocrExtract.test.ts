@@ -0,0 +1,197 @@
+import assert from "node:assert/strict";
+import { spawnSync } from "node:child_process";
+import path from "node:path";
+import { describe, it } from "node:test";
+
+const scriptsDir = path.join(process.cwd(), "scripts");
+const pythonBin =
+  process.env.OCR_PYTHON || process.env.PYTHON_BIN || (process.platform === "win32" ? "python" : "python3");
+const hasPython = spawnSync(pythonBin, ["--version"]).status === 0;
+
+function runPython(code: string, env: NodeJS.ProcessEnv = {}) {
+  const result = spawnSync(pythonBin, ["-c", code], {
+    cwd: scriptsDir,
+    encoding: "utf-8",
+    env: { ...process.env, ...env },
+    timeout: 60_000,
+  });
+  assert.equal(result.status, 0, result.stderr);
+  return JSON.parse(result.stdout.trim().split("\n").pop() ?? "null");
+}
+
+describe("ocr_extract.py parser", { skip: !hasPython && "python3 is not available" }, () => {
+  it("parses hostile replies without quadratic backtracking", () => {
+    const timings = runPython(`
+import json, time
+from ocr_extract import parse_universal_kv
+cases = {"colons": '":' * 8000, "keys": '"k": ' * 5000, "open_values": '"k": "v' * 3000,
+         "think": "<think>" * 8000, "fence": "\`" + " " * 80000 + "x"}
+out = {}
+for name, text in cases.items():
+    started = time.perf_counter()
+    parse_universal_kv(text)
+    out[name] = time.perf_counter() - started
+print(json.dumps(out))
+`);
+    for (const [name, seconds] of Object.entries(timings as Record<string, number>)) {
+      // Linear scans finish in milliseconds; the old backtracking took several seconds
+      assert.ok(seconds < 1, `${name} took ${seconds.toFixed(2)}s`);
+    }
+  });
+
+  it("still extracts pairs from truncated JSON", () => {
+    const parsed = runPython(`
+import json
+from ocr_extract import parse_universal_kv
+print(json.dumps(parse_universal_kv('{"Name": "O\\'Brien", "Size": "5\\'10", "Qty": 3, Date: 1/2/2024')))
+`);
+    assert.deepEqual(parsed.all_key_values, {
+      Name: "O'Brien",
+      Size: "5'10",
+      Qty: "3",
+      Date: "01/02/2024",
+    });
+  });
+});
+
+describe("ocr_extract.py response cache", { skip: !hasPython && "python3 is not available" }, () => {
+  it("misses the local cache when a generation setting changes between runs", () => {
+    const result = runPython(`
+import json, os, tempfile
+from ocr_extract import ResponseCache, local_cache_namespace
+
+base = {"quant": "none", "json_stop": True, "compile_model": False, "max_pixels": None,
+        "gpu_decode": False, "tile_rows": 1, "tile_overlap": 64}
+with tempfile.TemporaryDirectory() as tmp:
+    image = os.path.join(tmp, "scan.jpg")
+    with open(image, "wb") as f:
+        f.write(b"not really a jpeg")
+    cache_path = os.path.join(tmp, ".vlm_cache.json")
+
+    def run(**changes):
+        ns = local_cache_namespace("Qwen/Qwen3-VL-2B-Instruct", "auto", 512, None, {**base, **changes})
+        return ResponseCache(cache_path, ns)
+
+    first = run()
+    first.put(first.key(image, None), '{"all_key_values": {}}')
+    first.save()
+
+    out = {"same": run().get(run().key(image, None)) is not None}
+    for name, value in (("quant", "int4"), ("max_pixels", 1003520), ("tile_rows", 3), ("gpu_decode", True)):
+        again = run(**{name: value})
+        out[name] = again.get(again.key(image, None)) is not None
+print(json.dumps(out))
+`);
+    assert.deepEqual(result, { same: true, quant: false, max_pixels: false, tile_rows: false, gpu_decode: false });
+  });
+});
+
+describe("ocr_extract.py helpers", { skip: !hasPython && "python3 is not available" }, () => {
+  it("splits batched replies by image label, or by position when unlabelled", () => {
+    const result = runPython(`
+import json
+from ocr_extract import split_batch_reply
+
+def outcome(raw, names):
+    try:
+        return [json.loads(part) for part in split_batch_reply(raw, names)]
+    except ValueError:
+        return "error"
+
+labelled = json.dumps({"results": [{"image": "b.jpg", "k": "2"}, {"image": "a.jpg", "k": "1"}]})
+unlabelled = json.dumps([{"k": "1"}, {"k": "2"}])
+print(json.dumps({
+    "labelled": outcome(labelled, ["a.jpg", "b.jpg"]),
+    "unlabelled": outcome(unlabelled, ["a.jpg", "b.jpg"]),
+    "unlabelled_duplicates": outcome(unlabelled, ["a.jpg", "a.jpg"]),
+    "mismatch": outcome(labelled, ["a.jpg", "c.jpg"]),
+    "labelled_duplicates": outcome(json.dumps([{"image": "a.jpg"}, {"image": "a.jpg"}]), ["a.jpg", "a.jpg"]),
+    "partly_labelled": outcome(json.dumps([{"image": "a.jpg"}, {"k": "2"}]), ["a.jpg", "b.jpg"]),
+    "wrong_count": outcome(unlabelled, ["a.jpg", "b.jpg", "c.jpg"]),
+}))
+`);
+    assert.deepEqual(result, {
+      labelled: [{ k: "1" }, { k: "2" }],
+      unlabelled: [{ k: "1" }, { k: "2" }],
+      unlabelled_duplicates: [{ k: "1" }, { k: "2" }],
+      mismatch: "error",
+      labelled_duplicates: "error",
+      partly_labelled: "error",
+      wrong_count: "error",
+    });
+  });
+
+  it("stops generation only once the selected_key_values object closes", () => {
+    const result = runPython(String.raw`
+import json
+from ocr_extract import _JsonDoneTracker
+
+def stop_point(text):
+    tracker = _JsonDoneTracker()
+    for i, ch in enumerate(text):
+        if tracker.feed(ch):
+            return text[: i + 1]
+    return None
+
+print(json.dumps({
+    "single": stop_point('{"all_key_values": {"a": "1"}, "selected_key_values": {}} trailing'),
+    "braces_in_strings": stop_point('{"all_key_values": {"a": "} ] {"}, "selected_key_values": {"b": "x\\"}"}} more'),
+    "think": stop_point('<think>{"selected_key_values": {}}</think>{"selected_key_values": {}} after'),
+    "two_bodies": stop_point('{"all_key_values": {"a": "1"}}\n{"selected_key_values": {"b": "2"}} after'),
+    "first_only": stop_point('{"all_key_values": {"a": "1"}} and then nothing'),
+}))
+`);
+    assert.deepEqual(result, {
+      single: '{"all_key_values": {"a": "1"}, "selected_key_values": {}}',
+      braces_in_strings: '{"all_key_values": {"a": "} ] {"}, "selected_key_values": {"b": "x\\"}"}}',
+      think: '<think>{"selected_key_values": {}}</think>{"selected_key_values": {}}',
+      two_bodies: '{"all_key_values": {"a": "1"}}\n{"selected_key_values": {"b": "2"}}',
+      first_only: null,
+    });
+  });
+
+  it("walks folders in sorted(Path.rglob) order", () => {
+    const result = runPython(`
+import json, tempfile
+from pathlib import Path
+from ocr_extract import IMAGE_EXTS, _iter_images
+
+with tempfile.TemporaryDirectory() as tmp:
+    root = Path(tmp)
+    for rel in ("b.jpg", "a.png", "a/z.jpg", "a/b/c.webp", "a-b/x.JPG", "a.b/y.jpeg", "B/q.png",
+                "a/notes.txt", "a/b/.hidden.png", "z/.jpg", "10/1.tif", "9/2.bmp"):
+        path = root / rel
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(b"x")
+    expected = [p for p in sorted(root.rglob("*")) if p.is_file() and p.suffix.lower() in IMAGE_EXTS]
+    walked = list(_iter_images(tmp))
+    print(json.dumps({"same": walked == expected, "count": len(walked)}))
+`);
+    assert.deepEqual(result, { same: true, count: 10 });
+  });
+
+  it("streams structured.json byte for byte like write_json_array", () => {
+    const result = runPython(String.raw`
+import json, os, tempfile
+from ocr_extract import JsonArrayWriter, write_json_array
+
+records = [
+    {"image": "a.jpg", "llm_raw": "line one\nline two", "llm_parsed": {"all_key_values": {"Größe": "5'10"}}},
+    {"image": "b.jpg", "llm_raw": "", "llm_parsed": {"all_key_values": {}, "selected_key_values": {}}},
+    {"image": "c.jpg", "llm_raw": "[\"nested\"]", "llm_parsed": {"all_key_values": {"k": ["1", {"x": None}]}}},
+]
+out = {}
+with tempfile.TemporaryDirectory() as tmp:
+    for count in (0, 1, 3):
+        streamed, whole = os.path.join(tmp, f"s{count}.json"), os.path.join(tmp, f"w{count}.json")
+        with JsonArrayWriter(streamed) as writer:
+            for rec in records[:count]:
+                writer.write(rec)
+        write_json_array(records[:count], whole)
+        with open(streamed, "rb") as a, open(whole, "rb") as b:
+            out[str(count)] = a.read() == b.read()
+print(json.dumps(out))
+`);
+    assert.deepEqual(result, { "0": true, "1": true, "3": true });
+  });
+});